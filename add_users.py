@@ -1,64 +1,42 @@
 
 """
 批量添加用戶到資料庫的腳本
+用法: python add_users.py [users.json]
 """
 import asyncio
+import json
 import sys
 import os
 
-# 添加當前目錄到路徑
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from database import get_db_manager
 
-from database import DatabaseManager
+# 預設用戶列表檔案
+DEFAULT_USERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
 
-async def add_multiple_users():
+def load_users(path: str) -> list:
+    """從 JSON 檔案讀取用戶列表"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+async def add_multiple_users(users_to_add: list):
     """批量添加用戶"""
-    db = DatabaseManager()
-    
-    # 用戶列表  
-    users_to_add = [
-        {
-            'user_id': 1001,  # 這裡需要實際的 Telegram user_id
-            'username': 'N3',
-            'display_name': '@N3',
-            'first_name': 'N3'
-        },
-        {
-            'user_id': 1002,
-            'username': 'J', 
-            'display_name': '@J',
-            'first_name': 'J'
-        },
-        {
-            'user_id': 1003,
-            'username': 'NIKE',
-            'display_name': '@NIKE', 
-            'first_name': 'NIKE'
-        },
-        {
-            'user_id': 1004,
-            'username': 'Z8',
-            'display_name': '@Z8',
-            'first_name': 'Z8'
-        }
-    ]
+    db = get_db_manager()
     
     print("🚀 開始批量添加用戶...")
     
-    for user in users_to_add:
-        success = await db.add_user(
-            user_id=user['user_id'],
-            username=user['username'],
-            display_name=user['display_name'],
-            first_name=user['first_name']
-        )
-        
-        if success:
-            print(f"✅ 成功添加用戶: {user['username']}")
-        else:
-            print(f"❌ 添加用戶失敗: {user['username']}")
+    # 一次批量寫入所有用戶
+    success = await db.add_users_bulk([
+        (user['user_id'], user['username'], user['display_name'], user['first_name'])
+        for user in users_to_add
+    ])
+    
+    if success:
+        print(f"✅ 成功添加 {len(users_to_add)} 個用戶")
+    else:
+        print(f"❌ 批量添加用戶失敗，共 {len(users_to_add)} 個用戶未寫入")
     
     print("📊 批量添加完成！")
 
 if __name__ == "__main__":
-    asyncio.run(add_multiple_users())
+    users_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_USERS_FILE
+    asyncio.run(add_multiple_users(load_users(users_file)))
@@ -5,25 +5,42 @@ Configures and initializes the Telegram bot with all handlers
 
 import logging
 import os
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram import BotCommand
+from telegram.constants import ParseMode
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, Defaults, filters
 
-from database import DatabaseManager
+from database import get_db_manager
 from handlers import BotHandlers
 import config
 
 logger = logging.getLogger(__name__)
 
+# Commands shown in the Telegram command menu
+BOT_COMMANDS = (
+    BotCommand("start", "啟動機器人"),
+    BotCommand("help", "顯示幫助信息"),
+    BotCommand("restart", "重新啟動機器人（管理員）"),
+)
+
 def create_bot():
     """Create and configure the bot application"""
     try:
         # Initialize database
-        db_manager = DatabaseManager()
+        db_manager = get_db_manager()
         
         # Initialize handlers
         bot_handlers = BotHandlers(db_manager)
         
         # Create application
-        application = Application.builder().token(config.get_bot_token()).build()
+        # Replies are HTML unless a handler passes parse_mode=None
+        application = (
+            Application.builder()
+            .token(config.get_bot_token())
+            .defaults(Defaults(parse_mode=ParseMode.HTML))
+            .connection_pool_size(config.TELEGRAM_CONNECTION_POOL_SIZE)
+            .pool_timeout(config.TELEGRAM_POOL_TIMEOUT)
+            .build()
+        )
         
         # Command handlers
         application.add_handler(CommandHandler("start", bot_handlers.start_command))
@@ -43,16 +60,17 @@ def create_bot():
         async def error_handler(update, context):
             """Handle errors"""
             try:
-                logger.error(f"Update {update} caused error {context.error}")
+                logger.error("Update %s caused error %s", update, context.error)
                 
                 # Try to send error message to user
                 if update and update.effective_message:
                     await update.effective_message.reply_text(
                         "❌ 系統發生錯誤，請稍後再試\n"
-                        "如問題持續，請聯繫管理員"
+                        "如問題持續，請聯繫管理員",
+                        parse_mode=None
                     )
             except Exception as e:
-                logger.error(f"Error in error handler: {e}")
+                logger.error("Error in error handler: %s", e)
         
         application.add_error_handler(error_handler)
         
@@ -60,7 +78,7 @@ def create_bot():
         return application
         
     except Exception as e:
-        logger.error(f"❌ Error creating bot application: {e}")
+        logger.error("❌ Error creating bot application: %s", e)
         raise
 
 # Additional bot configuration
@@ -68,27 +86,27 @@ async def post_init(application):
     """Post initialization setup"""
     try:
         bot_info = await application.bot.get_me()
-        logger.info(f"✅ Bot initialized: @{bot_info.username} ({bot_info.first_name})")
+        logger.info("✅ Bot initialized: @%s (%s)", bot_info.username, bot_info.first_name)
         
         # Set bot commands
-        from telegram import BotCommand
-        commands = [
-            BotCommand("start", "啟動機器人"),
-            BotCommand("help", "顯示幫助信息"),
-            BotCommand("restart", "重新啟動機器人（管理員）"),
-        ]
-        
-        await application.bot.set_my_commands(commands)
+        await application.bot.set_my_commands(BOT_COMMANDS)
         logger.info("✅ Bot commands set successfully")
         
     except Exception as e:
-        logger.error(f"❌ Error in post initialization: {e}")
+        logger.error("❌ Error in post initialization: %s", e)
 
 def run_bot():
     """Run the bot (alternative entry point)"""
     try:
         import asyncio
         
+        # Use uvloop's faster event loop when it is installed
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+        
         async def main():
             application = create_bot()
             await application.initialize()
@@ -104,7 +122,7 @@ def run_bot():
     except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by user")
     except Exception as e:
-        logger.error(f"❌ Error running bot: {e}")
+        logger.error("❌ Error running bot: %s", e)
 
 if __name__ == "__main__":
     run_bot()
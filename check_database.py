@@ -6,14 +6,58 @@
 """
 
 import asyncio
+import io
 import os
 import logging
+import sys
 from datetime import datetime
 
 # 設定日誌
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 各表數量，合併為單一查詢以減少往返
+COUNTS_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM users) AS user_count,
+    (SELECT COUNT(*) FROM transactions) AS transaction_count,
+    (SELECT COUNT(*) FROM groups) AS group_count,
+    (SELECT COUNT(*) FROM exchange_rates) AS rate_count
+"""
+
+def _print_report(cursor, format_date, out):
+    """輸出各表數量與最近交易，兩種資料庫共用"""
+    # 一次查詢取得各表數量
+    cursor.execute(COUNTS_QUERY)
+    counts = cursor.fetchone()
+    print(f"👥 用戶數量: {counts['user_count']}", file=out)
+    print(f"💰 交易記錄數量: {counts['transaction_count']}", file=out)
+    print(f"👥 群組數量: {counts['group_count']}", file=out)
+    print(f"💱 匯率記錄數量: {counts['rate_count']}", file=out)
+    
+    # 最近的交易
+    cursor.execute("""
+    SELECT t.date, t.currency, t.amount, t.transaction_type, u.first_name 
+    FROM transactions t 
+    LEFT JOIN users u ON t.user_id = u.user_id 
+    ORDER BY t.created_at DESC 
+    LIMIT 5
+    """)
+    recent_transactions = cursor.fetchall()
+    
+    print(f"\n📋 最近 5 筆交易:", file=out)
+    if recent_transactions:
+        # 以欄位名稱存取，sqlite3.Row 與 RealDictCursor 皆適用
+        for i, tx in enumerate(recent_transactions, 1):
+            date_str = format_date(tx['date']) if tx['date'] else "N/A"
+            currency = tx['currency'] or "N/A"
+            amount = tx['amount'] or 0
+            tx_type = "收入" if tx['transaction_type'] == 'income' else "支出"
+            user_name = tx['first_name'] or "未知用戶"
+            print(f"  {i}. {date_str} - {currency}{amount:,.0f} ({tx_type}) - {user_name}", file=out)
+    else:
+        print("  📝 暫無交易記錄", file=out)
+
 async def check_database():
     """檢查資料庫狀態"""
     
@@ -27,134 +71,52 @@ async def check_database():
             db = RailwayDatabaseManager()
             db_type = "PostgreSQL (Railway)"
         except ImportError as e:
-            logger.error(f"❌ 無法導入 PostgreSQL 資料庫管理器: {e}")
+            logger.error("❌ 無法導入 PostgreSQL 資料庫管理器: %s", e)
             return
     else:
         logger.info("📁 使用 SQLite 資料庫 (本地)")
         try:
-            from database import DatabaseManager
-            db = DatabaseManager()
+            from database import get_db_manager
+            db = get_db_manager()
             db_type = "SQLite (本地)"
         except ImportError as e:
-            logger.error(f"❌ 無法導入 SQLite 資料庫管理器: {e}")
+            logger.error("❌ 無法導入 SQLite 資料庫管理器: %s", e)
             return
     
-    print(f"\n{'='*50}")
-    print(f"📊 資料庫狀態檢查")
-    print(f"{'='*50}")
-    print(f"資料庫類型: {db_type}")
-    print(f"檢查時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*50}")
+    # 輸出先寫入緩衝區，結束時一次寫到 stdout
+    out = io.StringIO()
+    print(f"\n{'='*50}", file=out)
+    print(f"📊 資料庫狀態檢查", file=out)
+    print(f"{'='*50}", file=out)
+    print(f"資料庫類型: {db_type}", file=out)
+    print(f"檢查時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", file=out)
+    print(f"{'='*50}", file=out)
     
     try:
         # 檢查資料庫連接
         logger.info("🔍 檢查資料庫連接...")
         
-        # 檢查 users 表
         if hasattr(db, 'get_connection'):
             if database_url and database_url.startswith('postgresql'):
-                # PostgreSQL
-                async with db._lock:
-                    conn = db.get_connection()
-                    try:
-                        cursor = conn.cursor()
-                        
-                        # 檢查用戶數量
-                        cursor.execute("SELECT COUNT(*) FROM users")
-                        user_count = cursor.fetchone()[0]
-                        print(f"👥 用戶數量: {user_count}")
-                        
-                        # 檢查交易數量
-                        cursor.execute("SELECT COUNT(*) FROM transactions")
-                        transaction_count = cursor.fetchone()[0]
-                        print(f"💰 交易記錄數量: {transaction_count}")
-                        
-                        # 檢查群組數量
-                        cursor.execute("SELECT COUNT(*) FROM groups")
-                        group_count = cursor.fetchone()[0]
-                        print(f"👥 群組數量: {group_count}")
-                        
-                        # 檢查匯率記錄
-                        cursor.execute("SELECT COUNT(*) FROM exchange_rates")
-                        rate_count = cursor.fetchone()[0]
-                        print(f"💱 匯率記錄數量: {rate_count}")
-                        
-                        # 最近的交易
-                        cursor.execute("""
-                        SELECT t.date, t.currency, t.amount, t.transaction_type, u.first_name 
-                        FROM transactions t 
-                        LEFT JOIN users u ON t.user_id = u.user_id 
-                        ORDER BY t.created_at DESC 
-                        LIMIT 5
-                        """)
-                        recent_transactions = cursor.fetchall()
-                        
-                        print(f"\n📋 最近 5 筆交易:")
-                        if recent_transactions:
-                            for i, tx in enumerate(recent_transactions, 1):
-                                date_str = tx[0].strftime('%m/%d') if tx[0] else "N/A"
-                                currency = tx[1] or "N/A"
-                                amount = tx[2] or 0
-                                tx_type = "收入" if tx[3] == 'income' else "支出"
-                                user_name = tx[4] or "未知用戶"
-                                print(f"  {i}. {date_str} - {currency}{amount:,.0f} ({tx_type}) - {user_name}")
-                        else:
-                            print("  📝 暫無交易記錄")
-                        
-                    finally:
-                        conn.close()
+                # PostgreSQL: psycopg2 is blocking, so run the report off the event loop
+                def pg_report():
+                    with db.acquire() as conn:
+                        _print_report(conn.cursor(), lambda d: d.strftime('%m/%d'), out)
+                
+                await asyncio.to_thread(pg_report)
             else:
                 # SQLite
-                async with db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    
-                    # 檢查用戶數量
-                    cursor.execute("SELECT COUNT(*) FROM users")
-                    user_count = cursor.fetchone()[0]
-                    print(f"👥 用戶數量: {user_count}")
-                    
-                    # 檢查交易數量
-                    cursor.execute("SELECT COUNT(*) FROM transactions")
-                    transaction_count = cursor.fetchone()[0]
-                    print(f"💰 交易記錄數量: {transaction_count}")
-                    
-                    # 檢查群組數量
-                    cursor.execute("SELECT COUNT(*) FROM groups")
-                    group_count = cursor.fetchone()[0]
-                    print(f"👥 群組數量: {group_count}")
-                    
-                    # 檢查匯率記錄
-                    cursor.execute("SELECT COUNT(*) FROM exchange_rates")
-                    rate_count = cursor.fetchone()[0]
-                    print(f"💱 匯率記錄數量: {rate_count}")
-                    
-                    # 最近的交易
-                    cursor.execute("""
-                    SELECT t.date, t.currency, t.amount, t.transaction_type, u.first_name 
-                    FROM transactions t 
-                    LEFT JOIN users u ON t.user_id = u.user_id 
-                    ORDER BY t.created_at DESC 
-                    LIMIT 5
-                    """)
-                    recent_transactions = cursor.fetchall()
-                    
-                    print(f"\n📋 最近 5 筆交易:")
-                    if recent_transactions:
-                        for i, tx in enumerate(recent_transactions, 1):
-                            date_str = tx[0] if tx[0] else "N/A"
-                            currency = tx[1] or "N/A"
-                            amount = tx[2] or 0
-                            tx_type = "收入" if tx[3] == 'income' else "支出"
-                            user_name = tx[4] or "未知用戶"
-                            print(f"  {i}. {date_str} - {currency}{amount:,.0f} ({tx_type}) - {user_name}")
-                    else:
-                        print("  📝 暫無交易記錄")
+                async with db.get_read_connection() as conn:
+                    _print_report(conn.cursor(), lambda d: d, out)
         
-        print(f"\n✅ 資料庫檢查完成！")
+        print(f"\n✅ 資料庫檢查完成！", file=out)
         
     except Exception as e:
-        logger.error(f"❌ 資料庫檢查失敗: {e}")
-        print(f"❌ 錯誤: {e}")
+        logger.error("❌ 資料庫檢查失敗: %s", e)
+        print(f"❌ 錯誤: {e}", file=out)
+    finally:
+        sys.stdout.write(out.getvalue())
+        sys.stdout.flush()
 
 async def main():
     """主程序"""
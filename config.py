@@ -4,48 +4,66 @@ Contains environment variables and constants
 """
 
 import os
-from typing import List
+from functools import lru_cache
+from typing import FrozenSet, Tuple
+
+# Raw environment values, read once at import
+_ENV = os.environ
+_BOT_TOKEN = _ENV.get('BOT_TOKEN', '')
+_GROUP_ID_RAW = _ENV.get('GROUP_ID', '')
+_ADMIN_IDS_RAW = _ENV.get('ADMIN_IDS', '')
+_GOOGLE_MAPS_API_KEY = _ENV.get('GOOGLE_MAPS_API_KEY', '')
+_TIMEZONE = _ENV.get('TZ', 'Asia/Taipei')
 
 # Bot configuration
+# Environment values are fixed for the process lifetime, so each getter is
+# parsed once and then served from cache on the update path.
 def get_bot_token() -> str:
     """Get bot token from environment"""
-    return os.getenv('BOT_TOKEN', '')
+    return _BOT_TOKEN
 
+@lru_cache(maxsize=None)
 def get_group_id() -> int:
     """Get group ID from environment"""
-    return int(os.getenv('GROUP_ID', '0'))
+    return int(_GROUP_ID_RAW or '0')
 
-def get_group_ids() -> list:
+@lru_cache(maxsize=None)
+def get_group_ids() -> Tuple[int, ...]:
     """Get group IDs from environment, support multiple IDs separated by comma"""
-    group_ids_str = os.getenv('GROUP_ID', '')
-    if group_ids_str:
-        return [int(x.strip()) for x in group_ids_str.split(',') if x.strip()]
-    return []
+    return tuple(int(x.strip()) for x in _GROUP_ID_RAW.split(',') if x.strip())
 
-def get_admin_ids() -> List[int]:
+@lru_cache(maxsize=None)
+def get_admin_ids() -> Tuple[int, ...]:
     """Get admin IDs from environment"""
-    admin_ids_str = os.getenv('ADMIN_IDS', '')
-    if admin_ids_str:
-        return [int(x.strip()) for x in admin_ids_str.split(',') if x.strip()]
-    return []
+    return tuple(int(x.strip()) for x in _ADMIN_IDS_RAW.split(',') if x.strip())
+
+@lru_cache(maxsize=None)
+def get_admin_id_set() -> FrozenSet[int]:
+    """Get admin IDs as a frozenset for membership checks"""
+    return frozenset(get_admin_ids())
 
 def get_google_maps_api_key() -> str:
     """Get Google Maps API key from environment"""
-    return os.getenv('GOOGLE_MAPS_API_KEY', '')
+    return _GOOGLE_MAPS_API_KEY
 
 def get_timezone() -> str:
     """Get timezone from environment"""
-    return os.getenv('TZ', 'Asia/Taipei')
+    return _TIMEZONE
 
 # Default constants
 DEFAULT_EXCHANGE_RATE = 0.22  # Default CNY to USD rate
 
 # Database configuration
 DATABASE_PATH = "north_sea_bot.db"
+DB_POOL_SIZE = 10  # Max PostgreSQL connections
+
+# Telegram Bot API HTTP client: one keep-alive pool shared by all handlers
+TELEGRAM_CONNECTION_POOL_SIZE = 256
+TELEGRAM_POOL_TIMEOUT = 10.0
 
 # Logging configuration
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 # Application settings
-DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
\ No newline at end of file
+DEBUG = _ENV.get('DEBUG', 'False').lower() == 'true'
\ No newline at end of file
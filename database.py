@@ -5,6 +5,7 @@ Handles SQLite database operations for users, transactions, and settings
 
 import sqlite3
 import logging
+from pathlib import Path
 from datetime import datetime, date
 from typing import List, Dict, Optional, Tuple
 import asyncio
@@ -12,11 +13,96 @@ from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
+# Number of persistent read-only connections kept open
+READER_POOL_SIZE = 4
+
+# date_day columns count days since the Unix epoch
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# sqlite3 keeps compiled statements per connection, keyed by SQL text; since
+# connections are now long-lived, size the cache to hold every query we issue
+STATEMENT_CACHE_SIZE = 256
+
+# Per-connection tuning; these settings do not persist in the database file
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",  # Safe with WAL, avoids an fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",   # ~64 MB page cache
+    "PRAGMA mmap_size=268435456", # 256 MB memory-mapped I/O
+)
+
+def _convert_date(value: bytes) -> date:
+    """Return SQLite DATE columns as date objects, like psycopg2 does"""
+    return date.fromisoformat(value.decode())
+
+# Parse DATE once in the driver instead of strptime in every report loop;
+# TIMESTAMP columns stay the strings callers already split on
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", bytes.decode)
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    """Return the half-open [start, end) date range covering a month"""
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+def day_number(value: date) -> int:
+    """Return a date as whole days since 1970-01-01, matching the date_day column"""
+    return value.toordinal() - EPOCH_ORDINAL
+
+def day_range(year: int, month: int) -> Tuple[int, int]:
+    """Return month_range() as date_day bounds"""
+    start, end = month_range(year, month)
+    return day_number(start), day_number(end)
+
+def rates_by_date(rows, dates) -> Dict[date, Dict[str, float]]:
+    """Map each date to the latest TWD/CNY rates set on or before it
+    
+    rows are exchange_rates rows ordered by date ascending; their date may be
+    a date object (PostgreSQL) or an ISO string (SQLite).
+    """
+    names = {'TW': 'TWD', 'CN': 'CNY'}
+    current = {'TWD': 30.0, 'CNY': 7.0}
+    result = {}
+    i = 0
+    for day in sorted(set(dates)):
+        day_key = day.isoformat()
+        while i < len(rows) and str(rows[i]['date']) <= day_key:
+            current[names[rows[i]['currency']]] = float(rows[i]['rate'])
+            i += 1
+        result[day] = dict(current)
+    return result
+
 class DatabaseManager:
     def __init__(self, db_path: str = "north_sea_bot.db"):
         self.db_path = db_path
-        self._lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._group_name_cache: Dict[int, str] = {}
+        self._user_name_cache: Dict[int, str] = {}
         self.init_database()
+        
+        # One persistent writer guarded by _write_lock, plus a pool of read-only
+        # connections that WAL lets run alongside the writer without locking
+        self._writer = self._connect(self.db_path)
+        read_uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        self._readers: asyncio.Queue = asyncio.Queue()
+        for _ in range(READER_POOL_SIZE):
+            self._readers.put_nowait(self._connect(read_uri, uri=True))
+    
+    @staticmethod
+    def _connect(database: str, uri: bool = False) -> sqlite3.Connection:
+        """Open a tuned connection usable from any thread"""
+        conn = sqlite3.connect(
+            database, uri=uri, check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Autocommit; writes open their own transaction in _run_write
+            isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
     
     def init_database(self):
         """Initialize database tables"""
@@ -24,6 +110,10 @@ class DatabaseManager:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
+                # WAL lets readers proceed while a write is in progress;
+                # the journal mode is stored in the database file
+                cursor.execute("PRAGMA journal_mode=WAL")
+                
                 # Users table
                 cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -91,6 +181,65 @@ class DatabaseManager:
                 )
                 """)
                 
+                # Integer day numbers derived from the TEXT date, so range and
+                # equality filters seek on INTEGER index keys; being a VIRTUAL
+                # generated column it never needs to be written or backfilled
+                columns = {row[1] for row in cursor.execute("PRAGMA table_xinfo(transactions)")}
+                if "date_day" not in columns:
+                    cursor.execute("""
+                    ALTER TABLE transactions ADD COLUMN date_day INTEGER
+                    GENERATED ALWAYS AS (CAST(julianday(date) - 2440587.5 AS INTEGER)) VIRTUAL
+                    """)
+                
+                # Index for most-recent-first listings
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_created_at
+                ON transactions (created_at DESC)
+                """)
+                
+                # Composite indexes matching the user/group/month report queries;
+                # (user_id, group_id, date_day) also serves plain user_id lookups
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_user_group_day
+                ON transactions (user_id, group_id, date_day DESC)
+                """)
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_group_day
+                ON transactions (group_id, date_day DESC)
+                """)
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_day
+                ON transactions (date_day)
+                """)
+                
+                # funds had no natural key, so INSERT OR REPLACE only ever appended
+                # rows; the first time through, keep the newest row per fund and
+                # make the key unique so update_fund can upsert onto it. NULLs are
+                # distinct in a UNIQUE index, so a missing group_id keys as 0
+                cursor.execute("""
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'index' AND name = 'idx_funds_type_group_currency'
+                """)
+                if cursor.fetchone() is None:
+                    cursor.execute("""
+                    DELETE FROM funds WHERE id NOT IN (
+                        SELECT MAX(id) FROM funds
+                        GROUP BY fund_type, COALESCE(group_id, 0), currency
+                    )
+                    """)
+                    cursor.execute("""
+                    CREATE UNIQUE INDEX idx_funds_type_group_currency
+                    ON funds (fund_type, COALESCE(group_id, 0), currency)
+                    """)
+                
+                # Covering index: rate lookups are answered from the index alone.
+                # SQLite never treats an index on a virtual column as covering, so
+                # exchange_rates keys on its ISO date text rather than date_day
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_ex_currency_date_rate
+                ON exchange_rates (currency, date DESC, rate)
+                """)
+                
                 conn.commit()
                 logger.info("✅ Database initialized successfully")
                 
@@ -99,50 +248,133 @@ class DatabaseManager:
             raise
     
     @asynccontextmanager
-    async def get_connection(self):
-        """Get database connection with proper locking"""
-        async with self._lock:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
+    async def get_write_connection(self):
+        """Borrow the writer connection, serialized by the write lock"""
+        async with self._write_lock:
             try:
-                yield conn
+                yield self._writer
             finally:
-                conn.close()
+                if self._writer.in_transaction:
+                    # Discard uncommitted work left by a failed operation
+                    self._writer.rollback()
+    
+    # Ad-hoc callers may read and write, so they share the writer; read-only
+    # callers should use get_read_connection and skip the write lock
+    get_connection = get_write_connection
+    
+    @asynccontextmanager
+    async def get_read_connection(self):
+        """Borrow a read-only connection from the pool"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+    
+    def close(self):
+        """Close the writer and all pooled reader connections"""
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+    
+    # The sqlite3 calls below block, so each runs in a worker thread on a
+    # borrowed connection; long report queries no longer stall the event loop
+    
+    @staticmethod
+    def _run_query(conn: sqlite3.Connection, sql: str, params, one: bool):
+        """Execute a query and convert the result rows to dicts"""
+        cursor = conn.execute(sql, params)
+        if one:
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _run_write(conn: sqlite3.Connection, sql: str, params, many: bool) -> int:
+        """Execute a write in its own transaction and return the affected row count"""
+        # BEGIN IMMEDIATE takes the write lock up front; the connection context
+        # commits on success and rolls back if the statement raises
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+        return cursor.rowcount
+    
+    async def _fetchall(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        """Run a query on a reader connection and return all rows"""
+        async with self.get_read_connection() as conn:
+            return await asyncio.to_thread(self._run_query, conn, sql, params, False)
+    
+    async def _fetchone(self, sql: str, params: Tuple = ()) -> Optional[Dict]:
+        """Run a query on a reader connection and return the first row"""
+        async with self.get_read_connection() as conn:
+            return await asyncio.to_thread(self._run_query, conn, sql, params, True)
+    
+    async def _execute(self, sql: str, params: Tuple = ()) -> int:
+        """Run a write statement on the writer connection"""
+        async with self.get_write_connection() as conn:
+            return await asyncio.to_thread(self._run_write, conn, sql, params, False)
+    
+    async def _executemany(self, sql: str, rows: List[Tuple]) -> int:
+        """Run a write statement for every row in one transaction"""
+        async with self.get_write_connection() as conn:
+            return await asyncio.to_thread(self._run_write, conn, sql, rows, True)
     
     async def add_user(self, user_id: int, username: str = None, 
                        display_name: str = None, first_name: str = None, 
                        last_name: str = None) -> bool:
         """Add or update user information"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                INSERT OR REPLACE INTO users 
-                (user_id, username, display_name, first_name, last_name)
-                VALUES (?, ?, ?, ?, ?)
-                """, (user_id, username, display_name, first_name, last_name))
-                conn.commit()
-                return True
+            await self._execute("""
+            INSERT INTO users 
+            (user_id, username, display_name, first_name, last_name)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                display_name = excluded.display_name,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name
+            """, (user_id, username, display_name, first_name, last_name))
+            self._user_name_cache.pop(user_id, None)
+            return True
         except Exception as e:
             logger.error(f"Error adding user {user_id}: {e}")
             return False
     
+    async def add_users_bulk(self, rows: List[Tuple]) -> bool:
+        """Add or update many users in one transaction
+
+        Each row is (user_id, username, display_name, first_name).
+        """
+        try:
+            await self._executemany("""
+            INSERT INTO users 
+            (user_id, username, display_name, first_name)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                display_name = excluded.display_name,
+                first_name = excluded.first_name
+            """, rows)
+            for row in rows:
+                self._user_name_cache.pop(row[0], None)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding users in bulk: {e}")
+            return False
+    
     async def add_transaction(self, user_id: int, group_id: int, 
                             transaction_date: date, currency: str, 
                             amount: float, transaction_type: str,
                             created_by: int = None, description: str = None) -> bool:
         """Add a financial transaction"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                INSERT INTO transactions 
-                (user_id, group_id, date, currency, amount, transaction_type, created_by, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (user_id, group_id, transaction_date, currency, amount, 
-                      transaction_type, created_by or user_id, description))
-                conn.commit()
-                return True
+            await self._execute("""
+            INSERT INTO transactions 
+            (user_id, group_id, date, currency, amount, transaction_type, created_by, description)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, group_id, transaction_date, currency, amount, 
+                  transaction_type, created_by or user_id, description))
+            return True
         except Exception as e:
             logger.error(f"Error adding transaction: {e}")
             return False
@@ -151,39 +383,23 @@ class DatabaseManager:
                                   year: int = None) -> List[Dict]:
         """Get user transactions for specified period in specific group"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if month and year:
-                    if group_id:
-                        cursor.execute("""
-                        SELECT * FROM transactions 
-                        WHERE user_id = ? AND group_id = ? AND strftime('%Y', date) = ? AND strftime('%m', date) = ?
-                        ORDER BY date DESC
-                        """, (user_id, group_id, str(year), f"{month:02d}"))
-                    else:
-                        cursor.execute("""
-                        SELECT * FROM transactions 
-                        WHERE user_id = ? AND strftime('%Y', date) = ? AND strftime('%m', date) = ?
-                        ORDER BY date DESC
-                        """, (user_id, str(year), f"{month:02d}"))
-                else:
-                    # Current month
-                    current_date = datetime.now()
-                    if group_id:
-                        cursor.execute("""
-                        SELECT * FROM transactions 
-                        WHERE user_id = ? AND group_id = ? AND strftime('%Y-%m', date) = ?
-                        ORDER BY date DESC
-                        """, (user_id, group_id, current_date.strftime('%Y-%m')))
-                    else:
-                        cursor.execute("""
-                        SELECT * FROM transactions 
-                        WHERE user_id = ? AND strftime('%Y-%m', date) = ?
-                        ORDER BY date DESC
-                        """, (user_id, current_date.strftime('%Y-%m')))
-                
-                return [dict(row) for row in cursor.fetchall()]
+            if not (month and year):
+                # Current month
+                current_date = datetime.now()
+                year, month = current_date.year, current_date.month
+            start, end = day_range(year, month)
+            
+            if group_id:
+                return await self._fetchall("""
+                SELECT * FROM transactions 
+                WHERE user_id = ? AND group_id = ? AND date_day >= ? AND date_day < ?
+                ORDER BY date_day DESC
+                """, (user_id, group_id, start, end))
+            return await self._fetchall("""
+            SELECT * FROM transactions 
+            WHERE user_id = ? AND date_day >= ? AND date_day < ?
+            ORDER BY date_day DESC
+            """, (user_id, start, end))
         except Exception as e:
             logger.error(f"Error getting user transactions: {e}")
             return []
@@ -191,31 +407,18 @@ class DatabaseManager:
     async def get_group_transactions(self, group_id: int, month: int = None, year: int = None) -> List[Dict]:
         """Get all transactions for a specific group"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                if month and year:
-                    cursor.execute("""
-                    SELECT t.*, u.username, u.display_name, u.first_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE t.group_id = ? AND strftime('%Y', t.date) = ? AND strftime('%m', t.date) = ?
-                    ORDER BY t.date DESC, t.created_at DESC
-                    """, (group_id, str(year), f"{month:02d}"))
-                else:
-                    current_month = datetime.now().month
-                    current_year = datetime.now().year
-                    cursor.execute("""
-                    SELECT t.*, u.username, u.display_name, u.first_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE t.group_id = ? AND strftime('%Y', t.date) = ? AND strftime('%m', t.date) = ?
-                    ORDER BY t.date DESC, t.created_at DESC
-                    """, (group_id, str(current_year), f"{current_month:02d}"))
-
-                rows = cursor.fetchall()
-
-                return [dict(row) for row in rows]
+            if not (month and year):
+                current_date = datetime.now()
+                year, month = current_date.year, current_date.month
+            start, end = day_range(year, month)
+            
+            return await self._fetchall("""
+            SELECT t.*, u.username, u.display_name, u.first_name 
+            FROM transactions t
+            LEFT JOIN users u ON t.user_id = u.user_id
+            WHERE t.group_id = ? AND t.date_day >= ? AND t.date_day < ?
+            ORDER BY t.date_day DESC, t.created_at DESC
+            """, (group_id, start, end))
 
         except Exception as e:
             logger.error(f"Error getting group transactions: {e}")
@@ -224,36 +427,56 @@ class DatabaseManager:
     async def get_group_transactions_by_date(self, group_id: int, target_date: date) -> List[Dict]:
         """Get all transactions for a specific group on a specific date"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                cursor.execute("""
-                SELECT t.*, u.username, u.display_name, u.first_name 
-                FROM transactions t
-                LEFT JOIN users u ON t.user_id = u.user_id
-                WHERE t.group_id = ? AND t.date = ?
-                ORDER BY t.created_at DESC
-                """, (group_id, target_date))
-
-                rows = cursor.fetchall()
-
-                return [dict(row) for row in rows]
+            return await self._fetchall("""
+            SELECT t.*, u.username, u.display_name, u.first_name 
+            FROM transactions t
+            LEFT JOIN users u ON t.user_id = u.user_id
+            WHERE t.group_id = ? AND t.date_day = ?
+            ORDER BY t.created_at DESC
+            """, (group_id, day_number(target_date)))
 
         except Exception as e:
             logger.error(f"Error getting group transactions by date: {e}")
             return []
     
+    async def get_group_daily_total(self, group_id: int, target_date: date) -> float:
+        """Get a group's net income minus expenses on a specific date"""
+        try:
+            result = await self._fetchone("""
+            SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) AS total
+            FROM transactions
+            WHERE group_id = ? AND date_day = ?
+            """, (group_id, day_number(target_date)))
+            return (result['total'] if result else None) or 0.0
+        except Exception as e:
+            logger.error(f"Error getting daily total: {e}")
+            return 0.0
+    
+    async def get_group_monthly_total(self, group_id: int, year: int, month: int) -> float:
+        """Get a group's net income minus expenses for a month"""
+        try:
+            result = await self._fetchone("""
+            SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) AS total
+            FROM transactions
+            WHERE group_id = ? AND date_day >= ? AND date_day < ?
+            """, (group_id, *day_range(year, month)))
+            return (result['total'] if result else None) or 0.0
+        except Exception as e:
+            logger.error(f"Error getting monthly total: {e}")
+            return 0.0
+    
     async def set_exchange_rate(self, rate_date: date, rate: float, set_by: int, currency: str = 'TW') -> bool:
         """Set exchange rate for a specific date and currency"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                INSERT OR REPLACE INTO exchange_rates (date, currency, rate, set_by)
-                VALUES (?, ?, ?, ?)
-                """, (rate_date, currency, rate, set_by))
-                conn.commit()
-                return True
+            await self._execute("""
+            INSERT INTO exchange_rates (date, currency, rate, set_by)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(date, currency) DO UPDATE SET
+                rate = excluded.rate,
+                set_by = excluded.set_by,
+                created_at = CURRENT_TIMESTAMP
+            """, (rate_date, currency, rate, set_by))
+            return True
         except Exception as e:
             logger.error(f"Error setting exchange rate: {e}")
             return False
@@ -264,59 +487,85 @@ class DatabaseManager:
             if not rate_date:
                 rate_date = date.today()
             
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT rate FROM exchange_rates 
-                WHERE date <= ? AND currency = ?
-                ORDER BY date DESC 
-                LIMIT 1
-                """, (rate_date, currency))
-                
-                result = cursor.fetchone()
-                return result['rate'] if result else None
+            result = await self._fetchone("""
+            SELECT rate FROM exchange_rates 
+            WHERE date <= ? AND currency = ?
+            ORDER BY date DESC 
+            LIMIT 1
+            """, (rate_date, currency))
+            return result['rate'] if result else None
         except Exception as e:
             logger.error(f"Error getting exchange rate: {e}")
             return None
     
+    async def get_latest_exchange_rates(self, rate_date: date = None) -> Dict[str, float]:
+        """Get the TWD/CNY rates in effect on a given date, both looked up concurrently"""
+        tw_rate, cn_rate = await asyncio.gather(
+            self.get_exchange_rate(rate_date, 'TW'),
+            self.get_exchange_rate(rate_date, 'CN'),
+        )
+        return {'TWD': tw_rate or 30.0, 'CNY': cn_rate or 7.0}
+    
+    async def get_exchange_rates_for_dates(self, dates) -> Dict[date, Dict[str, float]]:
+        """Get the TWD/CNY rates in effect on each of the given dates in one query"""
+        if not dates:
+            return {}
+        try:
+            rows = await self._fetchall("""
+            SELECT date, currency, rate FROM exchange_rates
+            WHERE date <= ? AND currency IN ('TW', 'CN')
+            ORDER BY date
+            """, (max(dates),))
+        except Exception as e:
+            logger.error(f"Error getting exchange rates: {e}")
+            rows = []
+        return rates_by_date(rows, dates)
+    
     async def delete_transaction(self, user_id: int, transaction_date: date, 
                                currency: str, amount: float) -> bool:
         """Delete a specific transaction"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                DELETE FROM transactions 
-                WHERE user_id = ? AND date = ? AND currency = ? AND amount = ?
-                """, (user_id, transaction_date, currency, amount))
-                conn.commit()
-                return cursor.rowcount > 0
+            deleted = await self._execute("""
+            DELETE FROM transactions 
+            WHERE user_id = ? AND date_day = ? AND currency = ? AND amount = ?
+            """, (user_id, day_number(transaction_date), currency, amount))
+            return deleted > 0
         except Exception as e:
             logger.error(f"Error deleting transaction: {e}")
             return False
     
+    async def delete_transactions_bulk(self, user_id: int, rows: List[Tuple]) -> int:
+        """Delete many specific transactions in one transaction
+
+        Each row is (date, currency, amount). Returns the number of rows deleted.
+        """
+        try:
+            return await self._executemany("""
+            DELETE FROM transactions 
+            WHERE user_id = ? AND date_day = ? AND currency = ? AND amount = ?
+            """, [(user_id, day_number(d), currency, amount) for d, currency, amount in rows])
+        except Exception as e:
+            logger.error(f"Error deleting transactions in bulk: {e}")
+            return 0
+    
     async def delete_monthly_transactions(self, user_id: int, month: int, 
                                         year: int, currency: str = None) -> bool:
         """Delete all transactions for a specific month"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if currency:
-                    cursor.execute("""
-                    DELETE FROM transactions 
-                    WHERE user_id = ? AND strftime('%Y', date) = ? 
-                    AND strftime('%m', date) = ? AND currency = ?
-                    """, (user_id, str(year), f"{month:02d}", currency))
-                else:
-                    cursor.execute("""
-                    DELETE FROM transactions 
-                    WHERE user_id = ? AND strftime('%Y', date) = ? 
-                    AND strftime('%m', date) = ?
-                    """, (user_id, str(year), f"{month:02d}"))
-                
-                conn.commit()
-                return cursor.rowcount > 0
+            start, end = day_range(year, month)
+            
+            if currency:
+                deleted = await self._execute("""
+                DELETE FROM transactions 
+                WHERE user_id = ? AND date_day >= ? AND date_day < ? AND currency = ?
+                """, (user_id, start, end, currency))
+            else:
+                deleted = await self._execute("""
+                DELETE FROM transactions 
+                WHERE user_id = ? AND date_day >= ? AND date_day < ?
+                """, (user_id, start, end))
+            
+            return deleted > 0
         except Exception as e:
             logger.error(f"Error deleting monthly transactions: {e}")
             return False
@@ -325,15 +574,16 @@ class DatabaseManager:
                          group_id: int, updated_by: int) -> bool:
         """Update fund amount"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                INSERT OR REPLACE INTO funds 
-                (fund_type, amount, currency, group_id, updated_by)
-                VALUES (?, ?, ?, ?, ?)
-                """, (fund_type, amount, currency, group_id, updated_by))
-                conn.commit()
-                return True
+            await self._execute("""
+            INSERT INTO funds 
+            (fund_type, amount, currency, group_id, updated_by)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(fund_type, COALESCE(group_id, 0), currency) DO UPDATE SET
+                amount = excluded.amount,
+                updated_by = excluded.updated_by,
+                updated_at = CURRENT_TIMESTAMP
+            """, (fund_type, amount, currency, group_id, updated_by))
+            return True
         except Exception as e:
             logger.error(f"Error updating fund: {e}")
             return False
@@ -341,15 +591,11 @@ class DatabaseManager:
     async def get_fund_balance(self, fund_type: str, group_id: int) -> Dict[str, float]:
         """Get current fund balance"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT currency, amount FROM funds 
-                WHERE fund_type = ? AND group_id = ?
-                """, (fund_type, group_id))
-                
-                results = cursor.fetchall()
-                return {row['currency']: row['amount'] for row in results}
+            results = await self._fetchall("""
+            SELECT currency, amount FROM funds 
+            WHERE fund_type = ? AND group_id = ?
+            """, (fund_type, group_id))
+            return {row['currency']: row['amount'] for row in results}
         except Exception as e:
             logger.error(f"Error getting fund balance: {e}")
             return {}
@@ -357,76 +603,141 @@ class DatabaseManager:
     async def get_all_groups_transactions(self, month: int = None, year: int = None) -> List[Dict]:
         """Get transactions from all groups for fleet report"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if month and year:
-                    cursor.execute("""
-                    SELECT t.*, u.username, u.first_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE strftime('%Y', t.date) = ? AND strftime('%m', t.date) = ?
-                    ORDER BY t.date DESC, t.group_id
-                    """, (str(year), f"{month:02d}"))
-                else:
-                    # Current month
-                    current_date = datetime.now()
-                    cursor.execute("""
-                    SELECT t.*, u.username, u.first_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE strftime('%Y-%m', t.date) = ?
-                    ORDER BY t.date DESC, t.group_id
-                    """, (current_date.strftime('%Y-%m'),))
-                
-                return [dict(row) for row in cursor.fetchall()]
+            if not (month and year):
+                # Current month
+                current_date = datetime.now()
+                year, month = current_date.year, current_date.month
+            start, end = day_range(year, month)
+            
+            return await self._fetchall("""
+            SELECT t.*, u.username, u.first_name 
+            FROM transactions t
+            LEFT JOIN users u ON t.user_id = u.user_id
+            WHERE t.date_day >= ? AND t.date_day < ?
+            ORDER BY t.date_day DESC, t.group_id
+            """, (start, end))
         except Exception as e:
             logger.error(f"Error getting all groups transactions: {e}")
             return []
     
+    async def get_fleet_daily_aggregates(self, year: int, month: int) -> List[Dict]:
+        """Sum each day's TW/CN income per group for the fleet report, by date and group,
+        with the group's name joined in"""
+        try:
+            start, end = day_range(year, month)
+            return await self._fetchall("""
+            SELECT t.date, t.group_id, g.group_name,
+                   SUM(CASE WHEN t.currency = 'TW' THEN t.amount ELSE 0 END) AS tw,
+                   SUM(CASE WHEN t.currency = 'CN' THEN t.amount ELSE 0 END) AS cn
+            FROM transactions t
+            LEFT JOIN groups g ON g.group_id = t.group_id
+            WHERE t.transaction_type = 'income' AND t.currency IN ('TW', 'CN')
+              AND t.date_day >= ? AND t.date_day < ?
+            GROUP BY t.date, t.group_id, g.group_name
+            ORDER BY t.date, t.group_id
+            """, (start, end))
+        except Exception as e:
+            logger.error(f"Error getting fleet daily aggregates: {e}")
+            return []
+    
+    async def get_fleet_daily_totals(self, year: int, month: int) -> List[Dict]:
+        """Sum each day's TW/CN income across all groups, latest day first"""
+        try:
+            start, end = day_range(year, month)
+            return await self._fetchall("""
+            SELECT date,
+                   SUM(CASE WHEN currency = 'TW' THEN amount ELSE 0 END) AS tw,
+                   SUM(CASE WHEN currency = 'CN' THEN amount ELSE 0 END) AS cn
+            FROM transactions
+            WHERE transaction_type = 'income' AND currency IN ('TW', 'CN')
+              AND date_day >= ? AND date_day < ?
+            GROUP BY date
+            ORDER BY date DESC
+            """, (start, end))
+        except Exception as e:
+            logger.error(f"Error getting fleet daily totals: {e}")
+            return []
+    
     async def add_or_update_group(self, group_id: int, group_name: str) -> bool:
         """Add or update group information"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                INSERT OR REPLACE INTO groups 
-                (group_id, group_name)
-                VALUES (?, ?)
-                """, (group_id, group_name))
-                conn.commit()
-                return True
+            await self._execute("""
+            INSERT INTO groups 
+            (group_id, group_name)
+            VALUES (?, ?)
+            ON CONFLICT(group_id) DO UPDATE SET
+                group_name = excluded.group_name
+            """, (group_id, group_name))
+            self._group_name_cache[group_id] = group_name
+            return True
         except Exception as e:
             logger.error(f"Error adding/updating group: {e}")
             return False
     
     async def get_group_name(self, group_id: int) -> Optional[str]:
         """Get group name by group_id"""
+        if group_id in self._group_name_cache:
+            return self._group_name_cache[group_id]
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT group_name FROM groups WHERE group_id = ?
-                """, (group_id,))
-                result = cursor.fetchone()
-                return result['group_name'] if result else None
+            result = await self._fetchone("""
+            SELECT group_name FROM groups WHERE group_id = ?
+            """, (group_id,))
+            if not result:
+                return None
+            self._group_name_cache[group_id] = result['group_name']
+            return result['group_name']
         except Exception as e:
             logger.error(f"Error getting group name: {e}")
             return None
     
+    async def get_user_display_name(self, user_id: int) -> Optional[str]:
+        """Get user display name by user_id"""
+        if user_id in self._user_name_cache:
+            return self._user_name_cache[user_id]
+        try:
+            result = await self._fetchone("""
+            SELECT display_name, first_name, username FROM users WHERE user_id = ?
+            """, (user_id,))
+            if not result:
+                return f"User{user_id}"
+            # Prefer display_name, fallback to first_name, then username
+            name = result['display_name'] or result['first_name'] or result['username'] or f"User{user_id}"
+            self._user_name_cache[user_id] = name
+            return name
+        except Exception as e:
+            logger.error(f"Error getting user display name: {e}")
+            return f"User{user_id}"
+    
+    async def get_user_display_names(self, user_ids) -> Dict[int, str]:
+        """Get display names for several users at once, keyed by user_id"""
+        names = {uid: self._user_name_cache[uid] for uid in user_ids if uid in self._user_name_cache}
+        missing = [uid for uid in set(user_ids) if uid not in names]
+        if not missing:
+            return names
+        try:
+            placeholders = ", ".join("?" * len(missing))
+            rows = await self._fetchall(f"""
+            SELECT user_id, display_name, first_name, username FROM users
+            WHERE user_id IN ({placeholders})
+            """, tuple(missing))
+            # Prefer display_name, fallback to first_name, then username
+            for row in rows:
+                name = row['display_name'] or row['first_name'] or row['username'] or f"User{row['user_id']}"
+                self._user_name_cache[row['user_id']] = name
+                names[row['user_id']] = name
+        except Exception as e:
+            logger.error(f"Error getting user display names: {e}")
+        return names
+    
     async def find_user_by_username(self, username: str) -> Optional[Dict]:
         """Find user by username"""
         try:
             # 移除 @ 符號如果存在
             username = username.lstrip('@')
             
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT * FROM users WHERE username = ? OR display_name = ? OR first_name = ?
-                """, (username, f"@{username}", username))
-                result = cursor.fetchone()
-                return dict(result) if result else None
+            return await self._fetchone("""
+            SELECT * FROM users WHERE username = ? OR display_name = ? OR first_name = ?
+            """, (username, f"@{username}", username))
         except Exception as e:
             logger.error(f"Error finding user by username: {e}")
             return None
@@ -434,13 +745,19 @@ class DatabaseManager:
     async def get_all_users(self) -> List[Dict]:
         """Get all users in database"""
         try:
-            async with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT user_id, username, display_name, first_name, created_at FROM users
-                ORDER BY created_at DESC
-                """)
-                return [dict(row) for row in cursor.fetchall()]
+            return await self._fetchall("""
+            SELECT user_id, username, display_name, first_name, created_at FROM users
+            ORDER BY created_at DESC
+            """)
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
-            return []
\ No newline at end of file
+            return []
+
+_db_manager: Optional[DatabaseManager] = None
+
+def get_db_manager() -> DatabaseManager:
+    """Return the process-wide DatabaseManager, creating it on first use"""
+    global _db_manager
+    if _db_manager is None:
+        _db_manager = DatabaseManager()
+    return _db_manager
\ No newline at end of file
@@ -3,33 +3,35 @@ Fleet report formatting for North Sea Financial Bot
 Handles comprehensive fleet report generation with proper HTML formatting
 """
 
+import html
+import io
 import logging
+from array import array
+from collections import defaultdict
 from typing import List, Dict, Optional
 from datetime import datetime, date
-from decimal import Decimal
-from utils import fix_html_tags
 
 logger = logging.getLogger(__name__)
 
+# Currency formatters bound once, so the per-day and per-group lines do not
+# rebuild the same format specs on every call
+fmt_nt = "<code>NT${:,.0f}</code>".format
+fmt_cn = "<code>CN¥{:,.0f}</code>".format
+fmt_nt_usdt = "<code>NT${:,.0f}({:,.2f})</code>".format
+fmt_cn_usdt = "<code>CN¥{:,.0f}({:,.2f})</code>".format
+fmt_nt_total = "<code>NT${:,.0f}</code> → <code>USDT${:,.2f}</code>".format
+fmt_cn_total = "<code>CN¥{:,.0f}</code> → <code>USDT${:,.2f}</code>".format
+
+# Whole daily rows, newline included, written straight to the report buffer
+fmt_day_header = "<b>{} 台幣匯率{:.2f} 人民幣匯率{:.1f}</b>\n".format
+fmt_group_row = "    • {} {} <code>{}</code>\n".format
+
 class FleetReportFormatter:
     """Comprehensive fleet report formatter"""
     
     def __init__(self, db_manager):
         self.db = db_manager
     
-    def safe_float(self, value):
-        """Safely convert any numeric value to float"""
-        try:
-            if isinstance(value, Decimal):
-                return float(value)
-            elif isinstance(value, (int, float)):
-                return float(value)
-            elif hasattr(value, '__float__'):
-                return float(value)
-            return 0.0
-        except (ValueError, TypeError):
-            return 0.0
-    
     async def format_comprehensive_fleet_report(self, month: int = None, year: int = None) -> str:
         """Format comprehensive fleet report with daily breakdowns and group details"""
         try:
@@ -38,152 +40,135 @@ class FleetReportFormatter:
                 month = now.month
                 year = now.year
             
-            # Get all transactions from all groups
-            all_transactions = await self.db.get_all_groups_transactions(month, year)
+            # Let the database sum each day's TW/CN income per group, names included
+            aggregates = await self.db.get_fleet_daily_aggregates(year, month)
             
-            if not all_transactions:
+            if not aggregates:
                 return "<b>North™Sea 北金國際 2025年6月車隊報表</b>\n\n❌ 暫無數據"
             
             # Calculate overall totals
             overall_totals = {'TW': 0.0, 'CN': 0.0}
-            daily_transactions = {}
             group_data = {}
             
-            for t in all_transactions:
+            # Each day's per-group sums are kept as parallel columns; group names
+            # are interned so rows only carry a small index
+            daily_transactions = {}
+            daily_dates = {}
+            group_labels = []
+            group_index = {}
+            
+            for row in aggregates:
                 try:
-                    if t.get('transaction_type') == 'income':
-                        currency = str(t.get('currency', ''))
-                        amount = self.safe_float(t.get('amount', 0))
-                        
-                        if currency in overall_totals:
-                            overall_totals[currency] += amount
-                        
-                        # Group by date
-                        trans_date = t.get('transaction_date') or t.get('date')
-                        if isinstance(trans_date, str):
-                            date_obj = datetime.strptime(trans_date, '%Y-%m-%d').date()
-                        else:
-                            date_obj = trans_date
-                        
-                        day_key = date_obj.strftime('%m/%d')
-                        
-                        if day_key not in daily_transactions:
-                            daily_transactions[day_key] = []
-                        
-                        # Get user display name
-                        user_id = t.get('user_id')
-                        display_name = await self.db.get_user_display_name(user_id) if user_id else "未知用戶"
-                        if not display_name:
-                            display_name = t.get('username', f"User {user_id}")
-                        
-                        # Get group name
-                        group_id = t.get('group_id')
-                        group_name = await self.db.get_group_name(group_id) if group_id else "未知群組"
-                        
-                        daily_transactions[day_key].append({
-                            'currency': currency,
-                            'amount': amount,
-                            'user': display_name,
-                            'group': group_name,
-                            'type': 'income'
-                        })
-                        
+                    tw_amount = row['tw'] or 0.0
+                    cn_amount = row['cn'] or 0.0
+                    overall_totals['TW'] += tw_amount
+                    overall_totals['CN'] += cn_amount
+                    
+                    # Group by date
+                    date_obj = row['date']
+                    day_key = f"{date_obj.month:02d}/{date_obj.day:02d}"
+                    
+                    if day_key not in daily_transactions:
+                        daily_transactions[day_key] = {'group': array('i'), 'TW': array('d'), 'CN': array('d')}
+                        daily_dates[day_key] = date_obj
+                    day_columns = daily_transactions[day_key]
+                    
+                    # Get group name
+                    group_id = row['group_id']
+                    group_name = row['group_name'] if group_id else "未知群組"
+                    group_idx = group_index.get(group_name)
+                    if group_idx is None:
+                        group_idx = group_index[group_name] = len(group_labels)
+                        # Escaped once here so names cannot break the report's markup
+                        group_labels.append(html.escape(str(group_name)))
+                    
+                    day_columns['group'].append(group_idx)
+                    day_columns['TW'].append(tw_amount)
+                    day_columns['CN'].append(cn_amount)
+                    
                 except Exception as e:
                     logger.warning(f"Error processing transaction for fleet report: {e}")
                     continue
             
-            # Calculate USDT equivalents by summing daily conversions (will be calculated in daily loop)
-            tw_usdt_total = 0.0
-            cn_usdt_total = 0.0
+            # Look up every day's rates in one query before the daily loop
+            day_list = sorted(daily_transactions)
+            day_dates = [daily_dates[day_key] for day_key in day_list]
+            rates_by_day = await self.db.get_exchange_rates_for_dates(day_dates)
+            day_rates = [rates_by_day.get(day_date, {}) for day_date in day_dates]
+            
+            # Daily totals and their rates as parallel columns, one slot per day
+            tw_daily_arr = array('d', (sum(daily_transactions[day_key]['TW']) for day_key in day_list))
+            cn_daily_arr = array('d', (sum(daily_transactions[day_key]['CN']) for day_key in day_list))
+            tw_rate_arr = array('d', (rates.get('TWD') or 30.0 for rates in day_rates))
+            cn_rate_arr = array('d', (rates.get('CNY') or 7.0 for rates in day_rates))
+            
+            # Convert every day to USDT up front and total the columns
+            tw_usdt_arr = array('d', (amount / rate if amount > 0 else 0.0
+                                      for amount, rate in zip(tw_daily_arr, tw_rate_arr)))
+            cn_usdt_arr = array('d', (amount / rate if amount > 0 else 0.0
+                                      for amount, rate in zip(cn_daily_arr, cn_rate_arr)))
+            tw_usdt_total = sum(tw_usdt_arr)
+            cn_usdt_total = sum(cn_usdt_arr)
             
-            # Placeholder for report lines - header will be built after calculations
-            report_lines = []
+            # The USDT totals are known up front, so the header goes straight
+            # into the report buffer ahead of the daily details
+            final_report = io.StringIO()
+            write = final_report.write
+            write("<b>North™Sea 北金國際 2025年6月車隊報表</b>\n")
+            write("<b>◉ 台幣業績</b>\n")
+            write(fmt_nt_total(overall_totals['TW'], tw_usdt_total) + "\n")
+            write("<b>◉ 人民幣業績</b>\n")
+            write(fmt_cn_total(overall_totals['CN'], cn_usdt_total) + "\n")
+            write("_____________________________\n")
             
             # Add daily summaries
-            for day_key in sorted(daily_transactions.keys()):
+            for day_idx, day_key in enumerate(day_list):
                 try:
-                    day_trans = daily_transactions[day_key]
-                    
-                    # Calculate daily totals by currency
-                    tw_daily = sum(t['amount'] for t in day_trans if t['currency'] == 'TW')
-                    cn_daily = sum(t['amount'] for t in day_trans if t['currency'] == 'CN')
-                    
-                    # Get daily exchange rates from database using proper date conversion
-                    from datetime import datetime
-                    date_obj = datetime.strptime(f"2025-{day_key}", "%Y-%m/%d").date()
+                    day_columns = daily_transactions[day_key]
+                    tw_daily = tw_daily_arr[day_idx]
+                    cn_daily = cn_daily_arr[day_idx]
+                    day_tw_rate = tw_rate_arr[day_idx]
+                    day_cn_rate = cn_rate_arr[day_idx]
+                    tw_daily_usdt = tw_usdt_arr[day_idx]
+                    cn_daily_usdt = cn_usdt_arr[day_idx]
                     
-                    # Get actual exchange rates for this specific date
-                    day_tw_rate = await self.db.get_exchange_rate(date_obj, 'TW') or 30.0
-                    day_cn_rate = await self.db.get_exchange_rate(date_obj, 'CN') or 7.0
-                    
-                    # Calculate USDT equivalents
-                    tw_daily_usdt = tw_daily / day_tw_rate if tw_daily > 0 else 0
-                    cn_daily_usdt = cn_daily / day_cn_rate if cn_daily > 0 else 0
-                    
-                    # Accumulate total USDT amounts
-                    tw_usdt_total += tw_daily_usdt
-                    cn_usdt_total += cn_daily_usdt
+                    # Merge the day's groups sharing a name into [TW, CN] pairs
+                    group_daily_totals = defaultdict(lambda: [0.0, 0.0])
+                    for group_idx, tw_amount, cn_amount in zip(day_columns['group'],
+                                                               day_columns['TW'],
+                                                               day_columns['CN']):
+                        group_totals = group_daily_totals[group_labels[group_idx]]
+                        group_totals[0] += tw_amount
+                        group_totals[1] += cn_amount
                     
                     # Add date header with consistent formatting
-                    report_lines.append(f"<b>{day_key} 台幣匯率{day_tw_rate:.2f} 人民幣匯率{day_cn_rate:.1f}</b>")
+                    write(fmt_day_header(day_key, day_tw_rate, day_cn_rate))
                     
                     # Add daily totals line
                     daily_line_parts = []
                     if tw_daily > 0:
-                        daily_line_parts.append(f"<code>NT${tw_daily:,.0f}({tw_daily_usdt:,.2f})</code>")
+                        daily_line_parts.append(fmt_nt_usdt(tw_daily, tw_daily_usdt))
                     if cn_daily > 0:
-                        daily_line_parts.append(f"<code>CN¥{cn_daily:,.0f}({cn_daily_usdt:,.2f})</code>")
+                        daily_line_parts.append(fmt_cn_usdt(cn_daily, cn_daily_usdt))
                     
                     if daily_line_parts:
-                        report_lines.append(" ".join(daily_line_parts))
-                    
-                    # Group transactions by group for this day
-                    group_daily_totals = {}
-                    for trans in day_trans:
-                        group = trans['group']
-                        
-                        if group not in group_daily_totals:
-                            group_daily_totals[group] = {'TW': 0, 'CN': 0}
-                        group_daily_totals[group][trans['currency']] += trans['amount']
+                        write(" ".join(daily_line_parts) + "\n")
                     
                     # Display transactions grouped by group
-                    for group, amounts in group_daily_totals.items():
-                        group_line_parts = []
-                        if amounts['TW'] > 0:
-                            group_line_parts.append(f"<code>NT${amounts['TW']:,.0f}</code>")
-                        else:
-                            group_line_parts.append(f"<code>NT$0</code>")
-                        
-                        if amounts['CN'] > 0:
-                            group_line_parts.append(f"<code>CN¥{amounts['CN']:,.0f}</code>")
-                        else:
-                            group_line_parts.append(f"<code>CN¥0</code>")
-                        
-                        group_amounts = " ".join(group_line_parts)
-                        report_lines.append(f"    • {group_amounts} <code>{group}</code>")
+                    for group, (tw_amount, cn_amount) in group_daily_totals.items():
+                        tw_text = fmt_nt(tw_amount) if tw_amount > 0 else "<code>NT$0</code>"
+                        cn_text = fmt_cn(cn_amount) if cn_amount > 0 else "<code>CN¥0</code>"
+                        write(fmt_group_row(tw_text, cn_text, group))
                     
-                    report_lines.append("")  # Add blank line between days
+                    write("\n")  # Add blank line between days
                     
                 except Exception as e:
                     logger.warning(f"Error formatting daily fleet summary: {e}")
                     continue
             
-            # Build report header with correct USDT totals
-            final_report = [
-                "<b>North™Sea 北金國際 2025年6月車隊報表</b>",
-                "<b>◉ 台幣業績</b>",
-                f"<code>NT${overall_totals['TW']:,.0f}</code> → <code>USDT${tw_usdt_total:,.2f}</code>",
-                "<b>◉ 人民幣業績</b>",
-                f"<code>CN¥{overall_totals['CN']:,.0f}</code> → <code>USDT${cn_usdt_total:,.2f}</code>",
-                "_____________________________"
-            ]
-            
-            # Add daily details
-            final_report.extend(report_lines)
-            
-            # Join and fix HTML tags
-            final_report_text = "\n".join(final_report)
-            return fix_html_tags(final_report_text)
+            # Every tag above is emitted in balanced pairs, so no fix-up pass is
+            # needed; drop the trailing newline like a join would
+            return final_report.getvalue()[:-1]
             
         except Exception as e:
             logger.error(f"Error formatting comprehensive fleet report: {e}")
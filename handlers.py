@@ -5,37 +5,385 @@ Handles all user interactions and bot responses
 
 import logging
 import asyncio
-import sys
-import os
+import calendar
+import random
+from collections import OrderedDict
 from datetime import datetime, date
+from decimal import Decimal
 from typing import Optional, Dict
 import re
 
 from telegram import Update, Message
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from telegram.error import TelegramError
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.error import TelegramError, BadRequest
 
-# Add current directory to path and import timezone utilities
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import timezone_utils
-
-try:
-    from database import DatabaseManager
-except ImportError:
-    DatabaseManager = None
-
-try:
-    from railway_database import RailwayDatabaseManager
-except ImportError:
-    RailwayDatabaseManager = None
+from database import DatabaseManager
 from keyboards import BotKeyboards
-from utils import TransactionParser, ReportFormatter, ValidationUtils
+from utils import (TransactionParser, ReportFormatter, ValidationUtils, PersonalReportFormatter,
+                   FundCommand, UserState, UserStateStore)
+from new_report_format import format_new_group_report
+from fleet_report_formatter import FleetReportFormatter
 from list_formatter import ListFormatter
 import config
 
 logger = logging.getLogger(__name__)
 
+# Text command patterns, compiled once at import
+# 設定[M/D][CN]匯率<rate>: optional date (default today), CN for CNY (default TWD)
+RATE_SETTING_REGEX = re.compile(r'設定(?P<date>\d{1,2}/\d{1,2})?(?P<cur>CN)?匯率(?P<rate>\d+\.?\d*)')
+CLEAR_DATE_REGEX = re.compile(r'^(\d{1,2})$|^(\d{1,2}/\d{1,2})$')
+# 刪除"MM/DD"TW100 and 刪除"MM月"TW報表
+DELETE_RECORD_REGEX = re.compile(r'刪除["\'""]?(\d{1,2}/\d{1,2})["\'""]?(TW|CN)(\d+(?:\.\d+)?)')
+DELETE_MONTH_REGEX = re.compile(r'刪除["\'""]?(\d{1,2})月["\'""]?(TW|CN)報表')
+# Other prefixes that route a text message to the exchange rate setter
+RATE_COMMAND_PREFIXES = ('匯率設定', 'TWD', 'CNY')
+
+# Opening or closing HTML tag, for debug logging of formatted reports
+HTML_TAG_REGEX = re.compile(r'<[^>]+>')
+
+# Exchange rate confirmation, shared by the TWD and CNY paths
+RATE_SET_TEMPLATE = "✅ {name}匯率設定成功\n日期: {date:%Y-%m-%d}\n匯率: {rate}"
+CURRENCY_NAMES = {'TW': '台幣', 'CN': '人民幣'}
+
+# Symbols for the transaction confirmation message
+CURRENCY_SYMBOLS = {'TW': "💰", 'CN': "💴"}
+TYPE_SIGNS = {'income': "+", 'expense': "-"}
+
+# Messages longer than this are parsed in a worker thread
+OFFLOAD_PARSE_LENGTH = 512
+
+# Upper bound on the users/groups remembered as already written to the DB
+SEEN_CACHE_SIZE = 50_000
+
+# Static reply texts, built once at import
+WELCOME_TEMPLATE = """🎉 <b>歡迎使用北金管家 North™Sea ᴍ8ᴘ</b>
+
+👋 你好 {name}！
+
+🤖 我是專業的多幣別財務管理機器人，提供以下功能：
+
+💰 <b>記帳功能:</b>
+• 支援台幣(TWD)和人民幣(CNY)
+• 快速記錄收入和支出
+• 支援日期指定和代記帳
+
+📊 <b>報表功能:</b>
+• 個人月度報表
+• 群組統計報表
+• 歷史數據查詢
+
+💱 <b>匯率管理:</b>
+• 自訂匯率設定
+• 歷史匯率查詢
+
+💵 <b>資金管理:</b>
+• 公桶/私人資金分類
+• 餘額查詢統計
+
+⚙️ <b>快速開始:</b>
+點擊下方按鈕或輸入 /help 查看完整指令
+"""
+
+HELP_TEXT = """📖 <b>北金管家機器人指令說明</b>
+
+🔸 <b>基本指令</b>
+/start - 啟動機器人，顯示主選單
+/restart - 重新啟動機器人（僅管理員）
+/help - 顯示此幫助信息
+
+🔸 <b>報表指令</b>
+<code>📊個人報表</code> - 顯示個人當月收支報表
+<code>📊組別報表</code> - 顯示此群組的收支總計
+<code>📊車隊總表</code> - 顯示全群組的收支總計
+<code>📚歷史報表</code> - 查看過去月份的報表
+<code>初始化報表</code> - 清空所有個人報表數據
+
+🔸 <b>記帳指令 (多種格式輸入方式)</b>
+<code>TW+數字</code> - 記錄台幣收入
+<code>TW-數字</code> - 記錄台幣支出
+<code>CN+數字</code> - 記錄人民幣收入
+<code>CN-數字</code> - 記錄人民幣支出
+<code>台幣+數字</code> - 記錄台幣收入
+<code>人民幣-數字</code> - 記錄人民幣支出
+
+🔸 <b>日期記帳</b>
+<code>日期 TW+數字</code> - 記錄特定日期台幣收入
+<code>日期 TW-數字</code> - 記錄特定日期台幣支出
+<code>日期 CN+數字</code> - 記錄特定日期人民幣收入
+<code>日期 CN-數字</code> - 記錄特定日期人民幣支出
+
+🔸 <b>為其他用戶記帳</b>
+<code>@用戶名 日期 TW+數字</code> - 為指定用戶記錄台幣收入
+<code>@用戶名 日期 TW-數字</code> - 為指定用戶記錄台幣支出
+
+🔸 <b>資金管理</b>
+<code>公桶+數字</code> - 增加公桶資金
+<code>公桶-數字</code> - 減少公桶資金
+<code>私人+數字</code> - 增加私人資金
+<code>私人-數字</code> - 減少私人資金
+
+🔸 <b>匯率設置</b>
+<code>設置匯率 數字</code> - 設置今日匯率
+<code>設置"日期"匯率 數字</code> - 設置指定日期匯率
+
+🔸 <b>刪除記錄</b>
+<code>刪除"日期"TW金額</code> - 刪除指定日期台幣記錄
+<code>刪除"日期"CN金額</code> - 刪除指定日期人民幣記錄
+<code>刪除"月份"TW報表</code> - 刪除整個月份的台幣記錄
+<code>刪除"月份"CN報表</code> - 刪除整個月份的人民幣記錄
+
+🔸 <b>其他設置</b>
+<code>使用者設定 名稱</code> - 設置報表標題名稱
+<code>歡迎詞設定 內容</code> - 設置新成員加入群組時的歡迎訊息
+<code>列表</code> - 回覆訊息文本並輸入列表可格式化當前的文本內容
+
+💡 <b>提示:</b>
+• 所有指令都支援群組和私聊使用
+• 日期格式支援: MM/DD, YYYY-MM-DD
+• 金額支援小數點，但建議使用整數
+"""
+
+MAIN_MENU_TEXT = """🏠 <b>北金管家主選單</b>
+
+歡迎使用多幣別財務管理系統！
+
+請選擇您需要的功能：
+
+📊 <b>報表功能</b> - 查看個人或群組財務報表
+📚 <b>歷史查詢</b> - 查詢過往月份數據
+💱 <b>匯率管理</b> - 設置和查看匯率
+⚙️ <b>系統設置</b> - 個人化設定選項
+"""
+
+PAYOUT_MENU_TEXT = """📊 <b>出款報表</b>
+
+請選擇要查看的報表類型：
+
+📅 <b>當日報表</b> - 查看今日出款記錄
+📊 <b>當月報表</b> - 查看本月出款統計
+"""
+
+# Static menu, help and prompt texts for the callback and command handlers
+HISTORY_OPTIONS_TEXT = "📚 <b>歷史報表查詢</b>\n\n請選擇要查詢的月份："
+
+SETTINGS_MENU_TEXT = """⚙️ <b>設置選單</b>
+
+請選擇要設置的項目：
+
+👤 <b>使用者設定</b> - 設置顯示名稱
+💱 <b>匯率設定</b> - 管理匯率設定
+👋 <b>歡迎詞設定</b> - 設定群組歡迎訊息
+🗑️ <b>清空報表</b> - 清除歷史數據
+"""
+
+MONEY_ACTIONS_TEXT = "💰 <b>金額異動選單</b>\n\n請選擇操作類型："
+
+REPORT_DISPLAY_TEXT = "📊 <b>報表顯示選單</b>\n\n請選擇要查看的報表類型："
+
+COMMAND_HELP_MENU_TEXT = """🔣 <b>指令說明選單</b>
+
+請選擇您的身份以查看相應的指令說明："""
+
+CLEAR_REPORTS_MENU_TEXT = """🚯 <b>清空報表選單</b>
+
+⚠️ <b>注意：此操作不可逆！</b>
+
+請選擇要清空的報表類型：
+
+• 🚯清空個人報表 - 清空您的個人交易記錄
+• 🚯清空組別報表 - 清空當前群組記錄（需管理員權限）
+• 🚯清空車隊總表 - 清空所有群組記錄（需群主權限）"""
+
+USER_SETTINGS_TEXT = """👤 <b>使用者設定</b>
+
+管理群組內的使用者權限：
+
+• 👤群主 - 最高權限，可執行所有操作
+• 👤管理員 - 可管理組別報表和使用者
+• 👤操作員 - 可記帳和查看個人報表"""
+
+CLEAR_PERSONAL_TEXT = """🚯 <b>清空個人報表</b>
+
+請直接輸入要清空的月份或日期：
+
+💡 格式範例:
+• <code>6</code> - 清空6月報表
+• <code>6/12</code> - 清空6/12報表
+
+⚠️ 此操作將刪除該月份或當日的所有記錄，無法復原！"""
+
+CLEAR_GROUP_TEXT = """🚯 <b>清空組別報表</b>
+
+請直接輸入要清空的月份或日期：
+
+💡 格式範例:
+• <code>6</code> - 清空6月報表
+• <code>6/12</code> - 清空6/12報表
+
+⚠️ 此操作將刪除該月份或當日的所有群組記錄，無法復原！"""
+
+CLEAR_FLEET_TEXT = """🚯 <b>清空車隊總表</b>
+
+請直接輸入要清空的月份或日期：
+
+💡 格式範例:
+• <code>6</code> - 清空6月報表
+• <code>6/12</code> - 清空6/12報表
+
+⚠️ 此操作將刪除該月份或當日的所有車隊記錄，無法復原！"""
+
+TW_HELP_TEXT = """💰 <b>台幣記帳</b>
+
+請輸入交易格式：
+
+<b>台幣收入</b>
+<code>Tw+NN</code> <code>+NN</code>
+
+<b>台幣支出</b>
+<code>Tw-NN</code> <code>-NN</code>
+
+<b>指定日期</b>
+<code>MM/DD +NN</code> <code>MM/DD -NN</code>"""
+
+CN_HELP_TEXT = """💰 <b>人民幣記帳</b>
+
+請輸入交易格式：
+
+<b>人民幣收入</b>
+<code>Cn+NN</code> <code>+NN</code>
+
+<b>人民幣支出</b>
+<code>Cn-NN</code> <code>-NN</code>
+
+<b>指定日期</b>
+<code>MM/DD +NN</code> <code>MM/DD -NN</code>"""
+
+PUBLIC_FUND_HELP_TEXT = """💵 <b>公桶資金管理</b>
+
+<b>餘額:</b> <code>看當前的公桶餘額為多少</code>
+
+<b>操作格式：</b>
+<code>公桶+NN</code> <code>公桶-NN</code>"""
+
+PRIVATE_FUND_HELP_TEXT = """💵 <b>私人資金管理</b>
+
+<b>餘額:</b> <code>看當前的私人餘額為多少</code>
+
+<b>操作格式：</b>
+<code>私人+NN</code> <code>私人-NN</code>"""
+
+DELETE_HELP_TEXT = """❓ <b>刪除記錄指令格式</b>
+
+🔸 <b>刪除特定記錄</b>
+<code>刪除"日期"TW金額</code> - 刪除指定日期台幣記錄
+<code>刪除"日期"CN金額</code> - 刪除指定日期人民幣記錄
+
+🔸 <b>刪除月份記錄</b>
+<code>刪除"月份"TW報表</code> - 刪除整個月份的台幣記錄
+<code>刪除"月份"CN報表</code> - 刪除整個月份的人民幣記錄
+
+💡 <b>範例:</b>
+• <code>刪除"6/1"TW500</code> - 刪除6月1日台幣500元記錄
+• <code>刪除"6月"CN報表</code> - 刪除6月所有人民幣記錄
+"""
+
+TW_RATE_PROMPT_TEXT = """💰 <b>設定台幣匯率</b>
+
+請直接輸入以下格式的指令：
+
+🔹 <b>設定今日匯率:</b>
+   <code>設定匯率30.5</code>
+
+🔹 <b>設定指定日期匯率:</b>
+   <code>設定06/01匯率30.2</code>
+
+⚠️ 需要管理員權限才能設定匯率"""
+
+CN_RATE_PROMPT_TEXT = """💴 <b>設定人民幣匯率</b>
+
+請直接輸入以下格式的指令：
+
+🔹 <b>設定今日匯率:</b>
+   <code>設定CN匯率7.2</code>
+
+🔹 <b>設定指定日期匯率:</b>
+   <code>設定06/01CN匯率7.1</code>
+
+⚠️ 需要管理員權限才能設定匯率"""
+
+DATE_RATE_PROMPT_TEXT = """📅 <b>設定指定日期匯率</b>
+
+支援以下日期格式的匯率設定：
+
+🔹 <b>台幣匯率:</b>
+   <code>設定06/01匯率30.2</code>
+   <code>設定2024-06-01匯率30.2</code>
+
+🔹 <b>人民幣匯率:</b>
+   <code>設定06/01CN匯率7.1</code>
+   <code>設定2024-06-01CN匯率7.1</code>
+
+📝 <b>日期格式說明:</b>
+• MM/DD - 當年月日
+• YYYY-MM-DD - 完整日期
+• MM月DD日 - 中文格式
+
+⚠️ 需要管理員權限才能設定匯率"""
+
+
+# Role help pages keyed by the role in help_<role> callback data
+HELP_CONTENT_TEXTS = {
+    "owner": """1️⃣ <b>群主指令</b>
+
+🔸 <b>完整權限</b>
+• 所有管理員和操作員功能
+• 🚯清空車隊總表 - 清空所有群組數據
+• 👤使用者設定 - 管理所有用戶權限
+
+🔸 <b>系統管理</b>
+• 設定匯率、歡迎詞等系統參數
+• 管理群組設定和權限分配""",
+
+    "admin": """2️⃣ <b>管理員指令</b>
+
+🔸 <b>報表管理</b>
+• 📊組別報表 - 查看和管理群組報表
+• 🚯清空組別報表 - 清空當前群組數據
+
+🔸 <b>用戶管理</b>
+• 👤使用者設定 - 管理操作員權限
+• 💱匯率設定 - 設定交易匯率""",
+
+    "operator": """3️⃣ <b>操作員指令</b>
+
+🔸 <b>報表指令</b>
+• 📊個人報表 - 顯示個人當月收支報表
+• 🚯清空個人報表 - 清空所有個人報表數據
+
+🔸 <b>記帳指令</b>
+• 💰金額異動 - 按鍵內的功能都可以使用
+
+🔸 <b>列表指令</b>
+• 列表 - 回覆訊息文本並輸入列表可格式化當前的文本內容""",
+}
+
+# Display names for the roles in role_<role> callback data
+ROLE_NAMES = {
+    "owner": "群主",
+    "admin": "管理員",
+    "operator": "操作員"
+}
+
+# Display names for the clear-report actions
+CLEAR_ACTION_NAMES = {
+    'clear_personal': '個人報表',
+    'clear_group': '組別報表',
+    'clear_fleet': '車隊總表'
+}
+
+
 class BotHandlers:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
@@ -43,27 +391,108 @@ class BotHandlers:
         self.keyboards = BotKeyboards()
         self.parser = TransactionParser()
         self.formatter = ReportFormatter()
-        self.user_states = {}
+        self.fleet_formatter = FleetReportFormatter(db_manager)
+        self.personal_formatter = PersonalReportFormatter()
+        self.validator = ValidationUtils()
+        # User state tracking for multi-step operations; idle states expire
+        self.user_states = UserStateStore(ttl=300)
+        # Users and groups already upserted, keyed by the details written
+        self._seen_users = OrderedDict()
+        self._seen_groups = OrderedDict()
+
+        # Callback data routed by exact match to handlers that only take the query
+        self.query_callbacks = {
+            "history_report": self._show_history_options,
+            "exchange_rate": self._show_exchange_rate_menu,
+            "fleet_report": self._show_fleet_report,
+            "settings": self._show_settings_menu,
+            "main_menu": self._show_main_menu,
+            "money_actions": self._show_money_actions,
+            "report_display": self._show_report_display,
+            "settings_menu": self._show_settings_menu,
+            "command_help": self._show_command_help,
+            "currency_tw": self._show_tw_help,
+            "currency_cn": self._show_cn_help,
+            "fund_public": self._show_public_fund_help,
+            "fund_private": self._show_private_fund_help,
+            "clear_reports": self._show_clear_reports_menu,
+            "user_settings": self._show_user_settings,
+            "current_exchange_rates": self._show_current_exchange_rates,
+            "set_tw_rate": self._prompt_tw_rate_setting,
+            "set_cn_rate": self._prompt_cn_rate_setting,
+            "set_date_rate": self._prompt_date_rate_setting,
+            "history_personal": self._show_history_options,
+            "history_group": self._show_history_options,
+            "history_fleet": self._show_history_options,
+            "fleet_current": self._show_fleet_report,
+            "payout_daily": self._show_daily_payout_report,
+            "payout_monthly": self._show_monthly_payout_report,
+            # The callback query's sender and message chat are the update's
+            # effective user and chat
+            "personal_report": lambda query: self._show_personal_report(query, query.from_user),
+            "group_report": lambda query: self._show_group_report(query, query.message.chat),
+            "group_current": lambda query: self._show_group_report(query, query.message.chat),
+        }
+        # Callback data routed by prefix to handlers that take the query and
+        # the part of the data after the prefix
+        self.prefix_callbacks = tuple(
+            (prefix, len(prefix), handler) for prefix, handler in (
+                ("month_", self._dispatch_month_report),
+                ("clear_", self._handle_clear_report),
+                ("help_", self._show_help_content),
+                ("role_", self._show_role_management),
+            )
+        )
 
-    async def _send_message_with_menu(self, update, text: str, parse_mode='HTML'):
+        # Text commands routed by exact match to handlers that take no arguments
+        self.text_commands = {
+            '列表': self._handle_list_formatting,
+            '車隊報表': self._handle_fleet_report,
+            '初始化報表': self._handle_initialize_report,
+            '用戶列表': self._handle_user_list,
+            '查看用戶': self._handle_user_list,
+        }
+        # Text commands routed by prefix, bucketed on the first character so a
+        # non-command message is rejected with a single dict lookup
+        self.text_prefix_commands = {
+            '刪': (('刪除', self._handle_delete_commands),),
+            '使': (('使用者設定', self._handle_user_settings),),
+            '歡': (('歡迎詞設定', self._handle_welcome_setting),),
+            '查': (('查找用戶', self._handle_find_user),),
+        }
+
+    async def _send_message_with_menu(self, update, text: str):
         """Helper function to send message with main menu button"""
         keyboard = BotKeyboards.get_main_inline_keyboard()
         if update.message:
             await update.message.reply_text(
                 text=text,
-                reply_markup=keyboard,
-                parse_mode=parse_mode
+                reply_markup=keyboard
             )
         elif hasattr(update, 'callback_query') and update.callback_query:
             await update.callback_query.edit_message_text(
                 text=text,
-                reply_markup=keyboard,
-                parse_mode=parse_mode
+                reply_markup=keyboard
             )
 
-        self.validator = ValidationUtils()
-        # User state tracking for multi-step operations
-        self.user_states = {}
+    @staticmethod
+    def _remember(seen: OrderedDict, key, maxsize: int = SEEN_CACHE_SIZE):
+        """Record a key in a bounded seen-set, evicting the oldest entries"""
+        seen[key] = None
+        seen.move_to_end(key)
+        while len(seen) > maxsize:
+            seen.popitem(last=False)
+
+    async def _safe_edit(self, query, text: str, keyboard, error_text: str, error_keyboard=None):
+        """Edit a callback message, replacing it with an error notice if the edit fails"""
+        try:
+            await query.edit_message_text(text, reply_markup=keyboard)
+        except Exception as e:
+            # Pressing the same button twice leaves the message unchanged
+            if isinstance(e, BadRequest) and 'message is not modified' in e.message.lower():
+                return
+            logger.error(f"Error showing {query.data}: {e}")
+            await query.edit_message_text(error_text, reply_markup=error_keyboard)
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -80,39 +509,12 @@ class BotHandlers:
                 last_name=user.last_name
             )
 
-            # Welcome message
-            welcome_text = f"""🎉 <b>歡迎使用北金管家 North™Sea ᴍ8ᴘ</b>
-
-👋 你好 {user.first_name}！
-
-🤖 我是專業的多幣別財務管理機器人，提供以下功能：
-
-💰 <b>記帳功能:</b>
-• 支援台幣(TWD)和人民幣(CNY)
-• 快速記錄收入和支出
-• 支援日期指定和代記帳
-
-📊 <b>報表功能:</b>
-• 個人月度報表
-• 群組統計報表
-• 歷史數據查詢
-
-💱 <b>匯率管理:</b>
-• 自訂匯率設定
-• 歷史匯率查詢
-
-💵 <b>資金管理:</b>
-• 公桶/私人資金分類
-• 餘額查詢統計
-
-⚙️ <b>快速開始:</b>
-點擊下方按鈕或輸入 /help 查看完整指令
-"""
+            # Welcome message
+            welcome_text = WELCOME_TEMPLATE.format(name=user.first_name)
 
             # Send welcome with inline keyboard
             await update.message.reply_text(
                 welcome_text,
-                parse_mode='HTML',
                 reply_markup=self.keyboards.get_main_inline_keyboard()
             )
 
@@ -128,68 +530,8 @@ class BotHandlers:
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
-        help_text = """📖 <b>北金管家機器人指令說明</b>
-
-🔸 <b>基本指令</b>
-/start - 啟動機器人，顯示主選單
-/restart - 重新啟動機器人（僅管理員）
-/help - 顯示此幫助信息
-
-🔸 <b>報表指令</b>
-<code>📊個人報表</code> - 顯示個人當月收支報表
-<code>📊組別報表</code> - 顯示此群組的收支總計
-<code>📊車隊總表</code> - 顯示全群組的收支總計
-<code>📚歷史報表</code> - 查看過去月份的報表
-<code>初始化報表</code> - 清空所有個人報表數據
-
-🔸 <b>記帳指令 (多種格式輸入方式)</b>
-<code>TW+數字</code> - 記錄台幣收入
-<code>TW-數字</code> - 記錄台幣支出
-<code>CN+數字</code> - 記錄人民幣收入
-<code>CN-數字</code> - 記錄人民幣支出
-<code>台幣+數字</code> - 記錄台幣收入
-<code>人民幣-數字</code> - 記錄人民幣支出
-
-🔸 <b>日期記帳</b>
-<code>日期 TW+數字</code> - 記錄特定日期台幣收入
-<code>日期 TW-數字</code> - 記錄特定日期台幣支出
-<code>日期 CN+數字</code> - 記錄特定日期人民幣收入
-<code>日期 CN-數字</code> - 記錄特定日期人民幣支出
-
-🔸 <b>為其他用戶記帳</b>
-<code>@用戶名 日期 TW+數字</code> - 為指定用戶記錄台幣收入
-<code>@用戶名 日期 TW-數字</code> - 為指定用戶記錄台幣支出
-
-🔸 <b>資金管理</b>
-<code>公桶+數字</code> - 增加公桶資金
-<code>公桶-數字</code> - 減少公桶資金
-<code>私人+數字</code> - 增加私人資金
-<code>私人-數字</code> - 減少私人資金
-
-🔸 <b>匯率設置</b>
-<code>設置匯率 數字</code> - 設置今日匯率
-<code>設置"日期"匯率 數字</code> - 設置指定日期匯率
-
-🔸 <b>刪除記錄</b>
-<code>刪除"日期"TW金額</code> - 刪除指定日期台幣記錄
-<code>刪除"日期"CN金額</code> - 刪除指定日期人民幣記錄
-<code>刪除"月份"TW報表</code> - 刪除整個月份的台幣記錄
-<code>刪除"月份"CN報表</code> - 刪除整個月份的人民幣記錄
-
-🔸 <b>其他設置</b>
-<code>使用者設定 名稱</code> - 設置報表標題名稱
-<code>歡迎詞設定 內容</code> - 設置新成員加入群組時的歡迎訊息
-<code>列表</code> - 回覆訊息文本並輸入列表可格式化當前的文本內容
-
-💡 <b>提示:</b>
-• 所有指令都支援群組和私聊使用
-• 日期格式支援: MM/DD, YYYY-MM-DD
-• 金額支援小數點，但建議使用整數
-"""
-
         await update.message.reply_text(
-            help_text,
-            parse_mode='HTML',
+            HELP_TEXT,
             reply_markup=self.keyboards.get_main_inline_keyboard()
         )
 
@@ -198,7 +540,7 @@ class BotHandlers:
         user_id = update.effective_user.id
 
         # If no admin IDs configured, allow group admins or creator
-        admin_ids = config.get_admin_ids()
+        admin_ids = config.get_admin_id_set()
         if len(admin_ids) > 0 and user_id not in admin_ids:
             await update.message.reply_text("❌ 您沒有權限執行此操作")
             return
@@ -227,26 +569,21 @@ class BotHandlers:
             await update.message.reply_text("🔄 系統刷新中...")
 
             # Perform system refresh only (no actual restart)
-            import asyncio
-            await asyncio.sleep(1)
-
             try:
                 # Refresh database connection
                 if hasattr(self.db, 'init_database'):
                     self.db.init_database()
 
-                # Clear any cached user data
-                if hasattr(context, 'user_data'):
-                    context.user_data.clear()
-                if hasattr(context, 'chat_data'):
-                    context.chat_data.clear()
+                # Clear any cached user data; the command always comes from a
+                # user in a chat, so both dicts exist
+                context.user_data.clear()
+                context.chat_data.clear()
 
                 # Send completion message
                 await update.message.reply_text(
                     "✅ <b>系統刷新完成</b>\n\n"
                     "🚀 所有功能已恢復正常\n"
-                    "📊 繼續提供記帳服務",
-                    parse_mode='HTML'
+                    "📊 繼續提供記帳服務"
                 )
                 logger.info("Bot system refresh completed")
 
@@ -261,30 +598,40 @@ class BotHandlers:
     async def handle_transaction_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle transaction recording messages"""
         try:
-            logger = logging.getLogger(__name__)
-            logger.info(f"📨 Message handler called")
+            logger.info("📨 Message handler called")
 
             user = update.effective_user
             chat = update.effective_chat
             text = update.message.text
 
-            logger.info(f"👤 User: {user.id if user else 'None'}, Chat: {chat.id if chat else 'None'}")
-            logger.info(f"💬 Text: {text}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("👤 User: %s, Chat: %s", user.id if user else 'None', chat.id if chat else 'None')
+                logger.info("💬 Text: %s", text)
 
             if not text:
                 logger.warning("No text in message")
                 return
 
+            # Long messages are parsed off the event loop so one paste does
+            # not stall every other update
+            offload = len(text) > OFFLOAD_PARSE_LENGTH
+
             # Check for financial record message format first
-            financial_record = self._parse_financial_record(text)
+            if offload:
+                financial_record = await asyncio.to_thread(self._parse_financial_record, text)
+            else:
+                financial_record = self._parse_financial_record(text)
             if financial_record:
                 await self._handle_financial_record(update, context, financial_record)
                 return
 
             # Parse transaction
-            logger.info(f"🔍 Attempting to parse transaction text: '{text}'")
-            transaction_data = self.parser.parse_transaction(text, user.id)
-            logger.info(f"📊 Transaction parsing result: {transaction_data}")
+            logger.info("🔍 Attempting to parse transaction text: '%s'", text)
+            if offload:
+                transaction_data = await asyncio.to_thread(self.parser.parse_transaction, text, user.id)
+            else:
+                transaction_data = self.parser.parse_transaction(text, user.id)
+            logger.info("📊 Transaction parsing result: %s", transaction_data)
 
             if not transaction_data:
                 # Check for restart command with bot mention
@@ -307,22 +654,40 @@ class BotHandlers:
                 await self._handle_other_commands(update, context, text)
                 return
 
-            # Add user to database if not exists
-            await self.db.add_user(
-                user_id=user.id,
-                username=user.username,
-                display_name=user.full_name,
-                first_name=user.first_name,
-                last_name=user.last_name
-            )
+            # Add user to database if not exists; users and groups already
+            # written with the same details are skipped
+            user_key = (user.id, user.username, user.full_name, user.first_name, user.last_name)
+            seen_keys = []
+            upserts = []
+            if user_key not in self._seen_users:
+                seen_keys.append((self._seen_users, user_key))
+                upserts.append(self.db.add_user(
+                    user_id=user.id,
+                    username=user.username,
+                    display_name=user.full_name,
+                    first_name=user.first_name,
+                    last_name=user.last_name
+                ))
 
             # Auto-detect and save group name if it's a group chat
             if chat.type in ['group', 'supergroup'] and chat.title:
-                await self.db.add_or_update_group(chat.id, chat.title)
+                group_key = (chat.id, chat.title)
+                if group_key not in self._seen_groups:
+                    seen_keys.append((self._seen_groups, group_key))
+                    upserts.append(self.db.add_or_update_group(chat.id, chat.title))
+
+            # The user and group upserts are independent of each other. On
+            # PostgreSQL they run on separate pooled connections; SQLite has a
+            # single writer, so there they still queue behind each other
+            if upserts:
+                results = await asyncio.gather(*upserts)
+                for (seen, key), ok in zip(seen_keys, results):
+                    if ok:
+                        self._remember(seen, key)
 
             # Handle mentioned user
             target_user_id = user.id
-            if transaction_data['mentioned_user']:
+            if transaction_data.mentioned_user:
                 # TODO: Implement user lookup by username
                 # For now, use the current user
                 target_user_id = user.id
@@ -331,22 +696,23 @@ class BotHandlers:
             success = await self.db.add_transaction(
                 user_id=target_user_id,
                 group_id=chat.id if chat.type in ['group', 'supergroup'] else 0,
-                transaction_date=transaction_data['date'],
-                currency=transaction_data['currency'],
-                amount=transaction_data['amount'],
-                transaction_type=transaction_data['transaction_type'],
+                transaction_date=transaction_data.date,
+                currency=transaction_data.currency,
+                amount=transaction_data.amount,
+                transaction_type=transaction_data.transaction_type,
                 created_by=user.id
             )
 
             if success:
-                currency_symbol = "💰" if transaction_data['currency'] == 'TW' else "💴"
-                type_symbol = "+" if transaction_data['transaction_type'] == 'income' else "-"
-                date_str = transaction_data['date'].strftime('%m/%d')
+                currency = transaction_data.currency
+                currency_symbol = CURRENCY_SYMBOLS.get(currency, "💴")
+                type_symbol = TYPE_SIGNS.get(transaction_data.transaction_type, "-")
+                date_str = transaction_data.date.strftime('%m/%d')
 
                 # 確定用戶顯示名稱 - 顯示實際被記帳的用戶
-                if transaction_data.get('mentioned_user') and target_user_id != user.id:
+                if transaction_data.mentioned_user and target_user_id != user.id:
                     # 代記帳情況：顯示被@的用戶名稱
-                    user_display = f"@{transaction_data['mentioned_user']}"
+                    user_display = f"@{transaction_data.mentioned_user}"
                 elif user.username:
                     # 自己記帳：顯示自己的用戶名
                     user_display = f"@{user.username}"
@@ -356,12 +722,12 @@ class BotHandlers:
 
                 success_msg = f"""✅ 記帳成功
 
-{currency_symbol} {transaction_data['currency']}{type_symbol}{transaction_data['amount']:,.0f}
+{currency_symbol} {currency}{type_symbol}{transaction_data.amount:,.0f}
 📅 日期: {date_str}
 👤 用戶: {user_display}
 """
 
-                await update.message.reply_text(success_msg, parse_mode='HTML')
+                await update.message.reply_text(success_msg)
             else:
                 await update.message.reply_text("❌ 記帳失敗，請稍後再試")
 
@@ -376,34 +742,14 @@ class BotHandlers:
             chat = update.effective_chat
 
             if button_text == "📝選單":
-                main_text = """🏠 <b>北金管家主選單</b>
-
-歡迎使用多幣別財務管理系統！
-
-請選擇您需要的功能：
-
-📊 <b>報表功能</b> - 查看個人或群組財務報表
-📚 <b>歷史查詢</b> - 查詢過往月份數據
-💱 <b>匯率管理</b> - 設置和查看匯率
-⚙️ <b>系統設置</b> - 個人化設定選項
-"""
                 await update.message.reply_text(
-                    main_text,
-                    parse_mode='HTML',
+                    MAIN_MENU_TEXT,
                     reply_markup=self.keyboards.get_main_inline_keyboard()
                 )
 
             elif button_text == "📊出款報表":
-                payout_text = """📊 <b>出款報表</b>
-
-請選擇要查看的報表類型：
-
-📅 <b>當日報表</b> - 查看今日出款記錄
-📊 <b>當月報表</b> - 查看本月出款統計
-"""
                 await update.message.reply_text(
-                    payout_text,
-                    parse_mode='HTML',
+                    PAYOUT_MENU_TEXT,
                     reply_markup=self.keyboards.get_payout_report_keyboard()
                 )
 
@@ -411,25 +757,25 @@ class BotHandlers:
             logger.error(f"Error handling keyboard button: {e}")
             await update.message.reply_text("❌ 按鈕操作失敗")
 
-    async def _handle_fund_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE, fund_data: Dict):
+    async def _handle_fund_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE, fund_data: FundCommand):
         """Handle fund management commands"""
         try:
             user = update.effective_user
             chat = update.effective_chat
 
             # Get current fund balance
-            current_balance = await self.db.get_fund_balance(fund_data['fund_type'], chat.id)
+            current_balance = await self.db.get_fund_balance(fund_data.fund_type, chat.id)
 
             # Calculate new balance
             current_amount = current_balance.get('TW', 0)  # Default to TWD
-            if fund_data['operation'] == 'income':
-                new_amount = current_amount + fund_data['amount']
+            if fund_data.operation == 'income':
+                new_amount = current_amount + fund_data.amount
             else:
-                new_amount = current_amount - fund_data['amount']
+                new_amount = current_amount - fund_data.amount
 
             # Update fund
             success = await self.db.update_fund(
-                fund_type=fund_data['fund_type'],
+                fund_type=fund_data.fund_type,
                 amount=new_amount,
                 currency='TW',  # Default currency for funds
                 group_id=chat.id,
@@ -437,16 +783,16 @@ class BotHandlers:
             )
 
             if success:
-                fund_name = "公桶" if fund_data['fund_type'] == 'public' else "私人"
-                operation_text = "增加" if fund_data['operation'] == 'income' else "減少"
+                fund_name = "公桶" if fund_data.fund_type == 'public' else "私人"
+                operation_text = "增加" if fund_data.operation == 'income' else "減少"
 
                 msg = f"""✅ <b>{fund_name}資金{operation_text}成功</b>
 
-💰 {operation_text}金額: {fund_data['amount']:,.0f}
+💰 {operation_text}金額: {fund_data.amount:,.0f}
 💳 當前餘額: {new_amount:,.0f}
 👤 操作人員: {user.first_name}
 """
-                await update.message.reply_text(msg, parse_mode='HTML')
+                await update.message.reply_text(msg)
             else:
                 await update.message.reply_text("❌ 資金操作失敗")
 
@@ -459,80 +805,50 @@ class BotHandlers:
         try:
             text = text.strip()
 
-            # Exchange rate setting - enhanced detection
-            if ('設定' in text and '匯率' in text) or text.startswith('匯率設定') or any(text.startswith(curr) for curr in ['TWD', 'CNY']):
+            # Exchange rate setting - enhanced detection (設定...匯率 anywhere)
+            if text.startswith(RATE_COMMAND_PREFIXES) or ('設定' in text and '匯率' in text):
                 await self._handle_exchange_rate_setting(update, context, text)
                 return
 
-            # Delete commands
-            if text.startswith('刪除'):
-                await self._handle_delete_commands(update, context, text)
-                return
-
-            # User settings
-            if text.startswith('使用者設定'):
-                await self._handle_user_settings(update, context, text)
-                return
-
-            # Welcome message setting
-            if text.startswith('歡迎詞設定'):
-                await self._handle_welcome_setting(update, context, text)
-                return
-
-            # List formatting
-            if text == '列表':
-                await self._handle_list_formatting(update, context)
+            # Exact commands: list formatting, fleet report, initialize
+            # report, user management
+            if handler := self.text_commands.get(text):
+                await handler(update, context)
                 return
 
-            # Fleet report
-            if text == '車隊報表':
-                await self._handle_fleet_report(update, context)
-                return
-
-            # Initialize report
-            if text == '初始化報表':
-                await self._handle_initialize_report(update, context)
-                return
-
-            # User management commands
-            if text == '用戶列表' or text == '查看用戶':
-                await self._handle_user_list(update, context)
-                return
-
-            if text.startswith('查找用戶'):
-                await self._handle_find_user(update, context, text)
-                return
+            # Prefix commands: delete, user settings, welcome message, find user
+            for prefix, handler in self.text_prefix_commands.get(text[:1], ()):
+                if text.startswith(prefix):
+                    await handler(update, context, text)
+                    return
 
             # Check if user is in a state waiting for clear report input
             user_id = update.effective_user.id if update.effective_user else None
-            if user_id and user_id in self.user_states:
-                user_state = self.user_states[user_id]
-                if user_state.get('step') == 'waiting_date':
+            user_state = self.user_states.get(user_id) if user_id else None
+            if user_state:
+                if user_state.step == 'waiting_date':
                     await self._process_clear_report_date(update, context, user_state, text)
                     return
-                elif user_state.get('step') == 'waiting_confirmation':
+                elif user_state.step == 'waiting_confirmation':
                     await self._process_clear_report_confirmation(update, context, user_state, text)
                     return
 
         except Exception as e:
             logger.error(f"Error handling other commands: {e}")
 
-    async def _process_clear_report_date(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_state: dict, date_input: str):
+    async def _process_clear_report_date(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_state: UserState, date_input: str):
         """Process date input for clear report operations"""
         try:
             user_id = update.effective_user.id
-            action = user_state.get('action')
+            action = user_state.action
 
             # Validate date format
-            import re
-            date_pattern = r'^(\d{1,2})$|^(\d{1,2}/\d{1,2})$'
-            if not re.match(date_pattern, date_input.strip()):
+            if not CLEAR_DATE_REGEX.match(date_input.strip()):
                 await update.message.reply_text(
                     "❌ 日期格式錯誤\n\n"
                     "請輸入正確格式：\n"
                     "• 月份：<code>6</code>\n"
-                    "• 日期：<code>6/12</code>",
-                    parse_mode='HTML'
+                    "• 日期：<code>6/12</code>"
                 )
                 return
 
@@ -540,20 +856,14 @@ class BotHandlers:
             date_str = date_input.strip()
 
             # Update user state for confirmation
-            self.user_states[user_id] = {
-                'action': action,
-                'step': 'waiting_confirmation',
-                'date': date_str
-            }
+            self.user_states[user_id] = UserState(
+                action=action,
+                step='waiting_confirmation',
+                date=date_str
+            )
 
             # Generate confirmation message based on action
-            action_names = {
-                'clear_personal': '個人報表',
-                'clear_group': '組別報表', 
-                'clear_fleet': '車隊總表'
-            }
-
-            action_name = action_names.get(action, '報表')
+            action_name = CLEAR_ACTION_NAMES.get(action, '報表')
 
             # Create confirmation message
             text = f"""⚠️ <b>確認清空 {action_name}</b>
@@ -564,25 +874,23 @@ class BotHandlers:
 
 請輸入 <code>確認</code> 來執行刪除，或輸入其他任何內容取消操作。"""
 
-            await update.message.reply_text(text, parse_mode='HTML')
+            await update.message.reply_text(text)
 
         except Exception as e:
             logger.error(f"Error processing clear report date: {e}")
             # Clear user state on error
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            self.user_states.pop(user_id, None)
             await update.message.reply_text("❌ 處理日期輸入時發生錯誤")
 
-    async def _process_clear_report_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_state: dict, confirmation_input: str):
+    async def _process_clear_report_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_state: UserState, confirmation_input: str):
         """Process confirmation input for clear report operations"""
         try:
             user_id = update.effective_user.id
-            action = user_state.get('action')
-            date_str = user_state.get('date')
+            action = user_state.action
+            date_str = user_state.date
 
             # Clear user state
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            self.user_states.pop(user_id, None)
 
             # Check if user confirmed
             if confirmation_input.strip() == '確認':
@@ -590,17 +898,11 @@ class BotHandlers:
                 success = await self._execute_clear_report(user_id, action, date_str)
 
                 if success:
-                    action_names = {
-                        'clear_personal': '個人報表',
-                        'clear_group': '組別報表', 
-                        'clear_fleet': '車隊總表'
-                    }
-                    action_name = action_names.get(action, '報表')
+                    action_name = CLEAR_ACTION_NAMES.get(action, '報表')
 
                     await update.message.reply_text(
                         f"✅ <b>清空完成</b>\n\n"
-                        f"已成功清空 <code>{date_str}</code> 的{action_name}",
-                        parse_mode='HTML'
+                        f"已成功清空 <code>{date_str}</code> 的{action_name}"
                     )
                 else:
                     await update.message.reply_text("❌ 清空操作失敗，請稍後再試")
@@ -611,16 +913,13 @@ class BotHandlers:
         except Exception as e:
             logger.error(f"Error processing clear report confirmation: {e}")
             # Clear user state on error
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            self.user_states.pop(user_id, None)
             await update.message.reply_text("❌ 處理確認輸入時發生錯誤")
 
     async def _execute_clear_report(self, user_id: int, action: str, date_str: str) -> bool:
         """Execute the actual clear report operation"""
         try:
             # Parse date string to get month and day
-            import re
-            from datetime import datetime
 
             current_year = datetime.now().year
 
@@ -661,84 +960,26 @@ class BotHandlers:
     async def _handle_exchange_rate_setting(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
         """Handle exchange rate setting commands"""
         try:
-            import re
-            from datetime import datetime, date
 
             user = update.effective_user
             user_id = user.id
 
-            # Pattern 1: 設定匯率33.00 (current date, TWD)
-            match1 = re.match(r'設定匯率(\d+\.?\d*)', text)
-            if match1:
-                rate = float(match1.group(1))
-                today = date.today()
-                success = await self.db.set_exchange_rate(today, rate, user_id, 'TW')
-                if success:
-                    await update.message.reply_text(
-                        f"✅ 台幣匯率設定成功\n"
-                        f"日期: {today.strftime('%Y-%m-%d')}\n"
-                        f"匯率: {rate}",
-                        parse_mode='HTML'
-                    )
-                else:
-                    await update.message.reply_text("❌ 匯率設定失敗")
-                return
-
-            # Pattern 2: 設定6/1匯率33.00 (specific date, TWD)
-            match2 = re.match(r'設定(\d{1,2}/\d{1,2})匯率(\d+\.?\d*)', text)
-            if match2:
-                date_str = match2.group(1)
-                rate = float(match2.group(2))
-                month, day = map(int, date_str.split('/'))
-                current_year = date.today().year
-                rate_date = date(current_year, month, day)
-
-                success = await self.db.set_exchange_rate(rate_date, rate, user_id, 'TW')
-                if success:
-                    await update.message.reply_text(
-                        f"✅ 台幣匯率設定成功\n"
-                        f"日期: {rate_date.strftime('%Y-%m-%d')}\n"
-                        f"匯率: {rate}",
-                        parse_mode='HTML'
-                    )
-                else:
-                    await update.message.reply_text("❌ 匯率設定失敗")
-                return
-
-            # Pattern 3: 設定CN匯率7.5 (current date, CNY)
-            match3 = re.match(r'設定CN匯率(\d+\.?\d*)', text)
-            if match3:
-                rate = float(match3.group(1))
+            # 設定匯率33.00, 設定6/1匯率33.00, 設定CN匯率7.5 or 設定6/1CN匯率7.0
+            match = RATE_SETTING_REGEX.match(text)
+            if match:
+                rate = float(match.group('rate'))
+                currency = 'CN' if match.group('cur') else 'TW'
                 today = date.today()
-                success = await self.db.set_exchange_rate(today, rate, user_id, 'CN')
-                if success:
-                    await update.message.reply_text(
-                        f"✅ 人民幣匯率設定成功\n"
-                        f"日期: {today.strftime('%Y-%m-%d')}\n"
-                        f"匯率: {rate}",
-                        parse_mode='HTML'
-                    )
+                if match.group('date'):
+                    month, day = map(int, match.group('date').split('/'))
+                    rate_date = date(today.year, month, day)
                 else:
-                    await update.message.reply_text("❌ 匯率設定失敗")
-                return
-
-            # Pattern 4: 設定6/1CN匯率7.0 (specific date, CNY)
-            match4 = re.match(r'設定(\d{1,2}/\d{1,2})CN匯率(\d+\.?\d*)', text)
-            if match4:
-                date_str = match4.group(1)
-                rate = float(match4.group(2))
-                month, day = map(int, date_str.split('/'))
-                current_year = date.today().year
-                rate_date = date(current_year, month, day)
+                    rate_date = today
 
-                success = await self.db.set_exchange_rate(rate_date, rate, user_id, 'CN')
+                success = await self.db.set_exchange_rate(rate_date, rate, user_id, currency)
                 if success:
-                    await update.message.reply_text(
-                        f"✅ 人民幣匯率設定成功\n"
-                        f"日期: {rate_date.strftime('%Y-%m-%d')}\n"
-                        f"匯率: {rate}",
-                        parse_mode='HTML'
-                    )
+                    await update.message.reply_text(RATE_SET_TEMPLATE.format(
+                        name=CURRENCY_NAMES[currency], date=rate_date, rate=rate))
                 else:
                     await update.message.reply_text("❌ 匯率設定失敗")
                 return
@@ -750,8 +991,7 @@ class BotHandlers:
                 "• <code>設定匯率33.00</code> - 今日台幣匯率\n"
                 "• <code>設定6/1匯率33.00</code> - 指定日期台幣匯率\n"
                 "• <code>設定CN匯率7.5</code> - 今日人民幣匯率\n"
-                "• <code>設定6/1CN匯率7.0</code> - 指定日期人民幣匯率",
-                parse_mode='HTML'
+                "• <code>設定6/1CN匯率7.0</code> - 指定日期人民幣匯率"
             )
         except Exception as e:
             logger.error(f"Error handling exchange rate setting: {e}")
@@ -764,75 +1004,13 @@ class BotHandlers:
             await query.answer()
 
             data = query.data
-            user = update.effective_user
-            chat = update.effective_chat
 
-            if data == "personal_report":
-                await self._show_personal_report(query, user)
-            elif data == "group_report":
-                await self._show_group_report(query, chat)
-            elif data == "history_report":
-                await self._show_history_options(query)
-            elif data == "exchange_rate":
-                await self._show_exchange_rate_menu(query)
-            elif data == "fleet_report":
-                await self._show_fleet_report(query)
-            elif data == "settings":
-                await self._show_settings_menu(query)
-            elif data == "main_menu":
-                await self._show_main_menu(query)
-            elif data == "money_actions":
-                await self._show_money_actions(query)
-            elif data == "report_display":
-                await self._show_report_display(query)
-            elif data == "settings_menu":
-                await self._show_settings_menu(query)
-            elif data == "command_help":
-                await self._show_command_help(query)
-            elif data == "currency_tw":
-                await self._show_tw_help(query)
-            elif data == "currency_cn":
-                await self._show_cn_help(query)
-            elif data == "fund_public":
-                await self._show_public_fund_help(query)
-            elif data == "fund_private":
-                await self._show_private_fund_help(query)
-            elif data == "clear_reports":
-                await self._show_clear_reports_menu(query)
-            elif data == "user_settings":
-                await self._show_user_settings(query)
-            elif data == "current_exchange_rates":
-                await self._show_current_exchange_rates(query)
-            elif data == "set_tw_rate":
-                await self._prompt_tw_rate_setting(query)
-            elif data == "set_cn_rate":
-                await self._prompt_cn_rate_setting(query)
-            elif data == "set_date_rate":
-                await self._prompt_date_rate_setting(query)
-            elif data.startswith("clear_"):
-                await self._handle_clear_report(query, data)
-            elif data.startswith("help_"):
-                await self._show_help_content(query, data)
-            elif data.startswith("role_"):
-                await self._show_role_management(query, data)
-            elif data.startswith("month_"):
-                month = int(data.split("_")[1])
-                await self._show_monthly_report(query, user, month)
-            elif data == "history_personal":
-                await self._show_history_options(query)
-            elif data == "history_group":
-                await self._show_history_options(query)
-            elif data == "history_fleet":
-                await<replit_final_file>
- self._show_history_options(query)
-            elif data == "group_current":
-                await self._show_group_report(query, query.message.chat)
-            elif data == "fleet_current":
-                await self._show_fleet_report(query)
-            elif data == "payout_daily":
-                await self._show_daily_payout_report(query)
-            elif data == "payout_monthly":
-                await self._show_monthly_payout_report(query)
+            handler = self.query_callbacks.get(data)
+            if handler:
+                await handler(query)
+            elif routed := next(((plen, h) for prefix, plen, h in self.prefix_callbacks if data.startswith(prefix)), None):
+                plen, handler = routed
+                await handler(query, data[plen:])
             else:
                 keyboard = BotKeyboards.get_main_inline_keyboard()
                 await query.edit_message_text(
@@ -858,25 +1036,28 @@ class BotHandlers:
             chat = query.message.chat
             group_id = chat.id if chat.type in ['group', 'supergroup'] else None
 
-            # Get current month transactions for this group only
-            transactions = await self.db.get_user_transactions(user.id, group_id)
+            # Get current month transactions for this group only, and
+            # today's rates, concurrently
+            transactions, rates = await asyncio.gather(
+                self.db.get_user_transactions(user.id, group_id),
+                self.db.get_latest_exchange_rates(date.today())
+            )
 
             # Add group context to report title
             group_name = chat.title if group_id else "個人"
 
             # Format report using personal report formatter
-            from utils import PersonalReportFormatter
-            personal_formatter = PersonalReportFormatter()
-            report = personal_formatter.format_personal_report(
+            report = self.personal_formatter.format_personal_report(
                 transactions, 
                 user.first_name or user.username or f"User{user.id}",
-                group_name
+                group_name,
+                rates['TWD'],
+                rates['CNY']
             )
 
             keyboard = BotKeyboards.get_personal_report_keyboard()
             await query.edit_message_text(
                 report,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -902,9 +1083,6 @@ class BotHandlers:
             # Get current month group transactions
             transactions = await self.db.get_group_transactions(chat.id)
 
-            # Import the updated formatting function
-            from new_report_format import format_new_group_report
-
             # Format report using updated function with daily exchange rates
             report = await format_new_group_report(
                 transactions,
@@ -914,17 +1092,13 @@ class BotHandlers:
 
             keyboard = BotKeyboards.get_group_report_keyboard()
 
-            # Debug: Log the actual report content being sent
-            logger.info(f"Original report HTML: {repr(report[:200])}")
-
-            # Check if HTML tags are being corrupted before sending
-            import re
-            html_tags = re.findall(r'<[^>]+>', report[:500])
-            logger.info(f"HTML tags found: {html_tags[:5]}")
+            # Debug: Log the report content and check its HTML tags
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Original report HTML: %r", report[:200])
+                logger.debug("HTML tags found: %s", HTML_TAG_REGEX.findall(report[:500])[:5])
 
             await query.edit_message_text(
                 report,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -938,23 +1112,14 @@ class BotHandlers:
 
     async def _show_history_options(self, query):
         """Show history report options"""
-        try:
-            text = "📚 <b>歷史報表查詢</b>\n\n請選擇要查詢的月份："
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_month_selection_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing history options: {e}")
-            await query.edit_message_text("❌ 顯示歷史選項失敗")
+        await self._safe_edit(
+            query, HISTORY_OPTIONS_TEXT, self.keyboards.get_month_selection_keyboard(),
+            "❌ 顯示歷史選項失敗"
+        )
 
     async def _show_exchange_rate_info(self, query):
         """Show current exchange rate information"""
         try:
-            from datetime import date
 
             current_rate = await self.db.get_exchange_rate()
             cn_rate = current_rate if current_rate else config.DEFAULT_EXCHANGE_RATE
@@ -981,7 +1146,6 @@ class BotHandlers:
 
             await query.edit_message_text(
                 rate_text,
-                parse_mode='HTML',
                 reply_markup=self.keyboards.get_main_inline_keyboard()
             )
 
@@ -991,70 +1155,32 @@ class BotHandlers:
 
     async def _show_settings_menu(self, query):
         """Show settings menu"""
-        try:
-            settings_text = """⚙️ <b>設置選單</b>
-
-請選擇要設置的項目：
-
-👤 <b>使用者設定</b> - 設置顯示名稱
-💱 <b>匯率設定</b> - 管理匯率設定
-👋 <b>歡迎詞設定</b> - 設定群組歡迎訊息
-🗑️ <b>清空報表</b> - 清除歷史數據
-"""
-
-            await query.edit_message_text(
-                settings_text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_settings_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing settings menu: {e}")
-            await query.edit_message_text("❌ 顯示設置選單失敗")
+        await self._safe_edit(
+            query, SETTINGS_MENU_TEXT, self.keyboards.get_settings_keyboard(),
+            "❌ 顯示設置選單失敗"
+        )
 
     async def _show_main_menu(self, query):
         """Show main menu"""
-        try:
-            main_text = """🏠 <b>北金管家主選單</b>
-
-歡迎使用多幣別財務管理系統！
-
-請選擇您需要的功能：
-
-📊 <b>報表功能</b> - 查看個人或群組財務報表
-📚 <b>歷史查詢</b> - 查詢過往月份數據
-💱 <b>匯率管理</b> - 設置和查看匯率
-⚙️ <b>系統設置</b> - 個人化設定選項
-"""
-
-            await query.edit_message_text(
-                main_text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_main_inline_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing main menu: {e}")
-            await query.edit_message_text("❌ 顯示主選單失敗")
+        await self._safe_edit(
+            query, MAIN_MENU_TEXT, self.keyboards.get_main_inline_keyboard(),
+            "❌ 顯示主選單失敗"
+        )
 
     async def _show_fleet_report(self, query):
         """Show fleet report via callback - aggregates ALL groups"""
         try:
-            from datetime import datetime
-            from fleet_report_formatter import FleetReportFormatter
 
             now = datetime.now()
             year = now.year
             month = now.month
 
             # Use comprehensive fleet report formatter
-            fleet_formatter = FleetReportFormatter(self.db)
-            report = await fleet_formatter.format_comprehensive_fleet_report(month, year)
+            report = await self.fleet_formatter.format_comprehensive_fleet_report(month, year)
 
             keyboard = BotKeyboards.get_fleet_report_keyboard()
             await query.edit_message_text(
                 report,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -1066,19 +1192,28 @@ class BotHandlers:
                 reply_markup=keyboard
             )
 
+    async def _dispatch_month_report(self, query, month: str):
+        """Route month_<n> callbacks to the monthly report"""
+        await self._show_monthly_report(query, query.from_user, int(month))
+
     async def _show_monthly_report(self, query, user, month):
         """Show monthly report for specific month"""
         try:
             chat = query.message.chat
-            now = datetime.now()
-            year = now.year
-
-            # Get user transactions for the specified month
-            transactions = await self.db.get_user_transactions(
-                user_id=user.id,
-                group_id=chat.id,
-                month=month,
-                year=year
+            today = date.today()
+            year = today.year
+            # Rates in effect at month end, or today for the current month
+            rate_date = min(today, date(year, month, calendar.monthrange(year, month)[1]))
+
+            # Get user transactions for the specified month and its rates
+            transactions, rates = await asyncio.gather(
+                self.db.get_user_transactions(
+                    user_id=user.id,
+                    group_id=chat.id,
+                    month=month,
+                    year=year
+                ),
+                self.db.get_latest_exchange_rates(rate_date)
             )
 
             # Format the report
@@ -1086,19 +1221,18 @@ class BotHandlers:
             chat_name = chat.title if hasattr(chat, 'title') and chat.title else "群組"
 
             # Format report using personal report formatter
-            from utils import PersonalReportFormatter
-            personal_formatter = PersonalReportFormatter()
-            report = personal_formatter.format_personal_report(
+            report = self.personal_formatter.format_personal_report(
                 transactions, 
                 user_name,
-                chat_name
+                chat_name,
+                rates['TWD'],
+                rates['CNY']
             )
 
             keyboard = BotKeyboards.get_personal_report_keyboard()
             await query.edit_message_text(
                 text=report,
-                reply_markup=keyboard,
-                parse_mode='HTML'
+                reply_markup=keyboard
             )
 
         except Exception as e:
@@ -1111,73 +1245,31 @@ class BotHandlers:
 
     async def _show_money_actions(self, query):
         """Show money actions menu"""
-        try:
-            text = "💰 <b>金額異動選單</b>\n\n請選擇操作類型："
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_money_actions_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing money actions: {e}")
-            await query.edit_message_text("❌ 顯示金額異動選單失敗")
+        await self._safe_edit(
+            query, MONEY_ACTIONS_TEXT, self.keyboards.get_money_actions_keyboard(),
+            "❌ 顯示金額異動選單失敗"
+        )
 
     async def _show_report_display(self, query):
         """Show report display menu"""
-        try:
-            text = "📊 <b>報表顯示選單</b>\n\n請選擇要查看的報表類型："
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_report_display_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing report display: {e}")
-            await query.edit_message_text("❌ 顯示報表選單失敗")
+        await self._safe_edit(
+            query, REPORT_DISPLAY_TEXT, self.keyboards.get_report_display_keyboard(),
+            "❌ 顯示報表選單失敗"
+        )
 
     async def _show_command_help(self, query):
         """Show command help menu"""
-        try:
-            text = """🔣 <b>指令說明選單</b>
-
-請選擇您的身份以查看相應的指令說明："""
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_command_help_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing command help: {e}")
-            await query.edit_message_text("❌ 顯示指令說明失敗")
+        await self._safe_edit(
+            query, COMMAND_HELP_MENU_TEXT, self.keyboards.get_command_help_keyboard(),
+            "❌ 顯示指令說明失敗"
+        )
 
     async def _show_clear_reports_menu(self, query):
         """Show clear reports menu"""
-        try:
-            text = """🚯 <b>清空報表選單</b>
-
-⚠️ <b>注意：此操作不可逆！</b>
-
-請選擇要清空的報表類型：
-
-• 🚯清空個人報表 - 清空您的個人交易記錄
-• 🚯清空組別報表 - 清空當前群組記錄（需管理員權限）
-• 🚯清空車隊總表 - 清空所有群組記錄（需群主權限）"""
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_clear_reports_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing clear reports menu: {e}")
-            await query.edit_message_text("❌ 顯示清空報表選單失敗")
+        await self._safe_edit(
+            query, CLEAR_REPORTS_MENU_TEXT, self.keyboards.get_clear_reports_keyboard(),
+            "❌ 顯示清空報表選單失敗"
+        )
 
     async def _show_user_settings(self, query):
         """Show user settings menu with permission check"""
@@ -1187,179 +1279,86 @@ class BotHandlers:
 
             # Check if user has admin or owner permissions
             # For now, implement basic permission system - this can be enhanced later
-            text = """👤 <b>使用者設定</b>
-
-管理群組內的使用者權限：
-
-• 👤群主 - 最高權限，可執行所有操作
-• 👤管理員 - 可管理組別報表和使用者
-• 👤操作員 - 可記帳和查看個人報表"""
-
             await query.edit_message_text(
-                text,
-                parse_mode='HTML',
+                USER_SETTINGS_TEXT,
                 reply_markup=self.keyboards.get_user_settings_keyboard()
             )
 
         except Exception as e:
             logger.error(f"Error showing user settings: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回設置選單", callback_data="settings_menu")]]
+            keyboard = BotKeyboards.get_back_keyboard("🔙返回設置選單", "settings_menu")
             await query.edit_message_text(
                 "❌ 顯示使用者設定失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=keyboard
             )
 
-    async def _handle_clear_report(self, query, data):
-        """Handle clear report actions"""
-        try:
-            user = query.from_user
-            chat = query.message.chat
-
-            if data == "clear_personal":
-                # Set user state for clearing personal reports
-                user_id = user.id
-                self.user_states[user_id] = {
-                    'action': 'clear_personal',
-                    'step': 'waiting_date'
-                }
-
-                text = """🚯 <b>清空個人報表</b>
-
-請直接輸入要清空的月份或日期：
-
-💡 格式範例:
-• <code>6</code> - 清空6月報表
-• <code>6/12</code> - 清空6/12報表
-
-⚠️ 此操作將刪除該月份或當日的所有記錄，無法復原！"""
+    async def _handle_clear_report(self, query, target):
+        """Handle clear report actions"""
+        try:
+            user = query.from_user
+            chat = query.message.chat
+
+            if target == "personal":
+                # Set user state for clearing personal reports
+                user_id = user.id
+                self.user_states[user_id] = UserState(
+                    action='clear_personal',
+                    step='waiting_date'
+                )
 
-                keyboard = [[InlineKeyboardButton("🔙返回清空報表", callback_data="clear_reports")]]
+                keyboard = BotKeyboards.get_back_keyboard("🔙返回清空報表", "clear_reports")
                 await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(keyboard)
+                    CLEAR_PERSONAL_TEXT,
+                    reply_markup=keyboard
                 )
 
-            elif data == "clear_group":
+            elif target == "group":
                 # Set user state for clearing group reports
                 user_id = user.id
-                self.user_states[user_id] = {
-                    'action': 'clear_group',
-                    'step': 'waiting_date'
-                }
-
-                text = """🚯 <b>清空組別報表</b>
-
-請直接輸入要清空的月份或日期：
-
-💡 格式範例:
-• <code>6</code> - 清空6月報表
-• <code>6/12</code> - 清空6/12報表
-
-⚠️ 此操作將刪除該月份或當日的所有群組記錄，無法復原！"""
+                self.user_states[user_id] = UserState(
+                    action='clear_group',
+                    step='waiting_date'
+                )
 
-                keyboard = [[InlineKeyboardButton("🔙返回清空報表", callback_data="clear_reports")]]
+                keyboard = BotKeyboards.get_back_keyboard("🔙返回清空報表", "clear_reports")
                 await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(keyboard)
+                    CLEAR_GROUP_TEXT,
+                    reply_markup=keyboard
                 )
 
-            elif data == "clear_fleet":
+            elif target == "fleet":
                 # Set user state for clearing fleet reports
                 user_id = user.id
-                self.user_states[user_id] = {
-                    'action': 'clear_fleet',
-                    'step': 'waiting_date'
-                }
-
-                text = """🚯 <b>清空車隊總表</b>
-
-請直接輸入要清空的月份或日期：
-
-💡 格式範例:
-• <code>6</code> - 清空6月報表
-• <code>6/12</code> - 清空6/12報表
-
-⚠️ 此操作將刪除該月份或當日的所有車隊記錄，無法復原！"""
+                self.user_states[user_id] = UserState(
+                    action='clear_fleet',
+                    step='waiting_date'
+                )
 
-                keyboard = [[InlineKeyboardButton("🔙返回清空報表", callback_data="clear_reports")]]
+                keyboard = BotKeyboards.get_back_keyboard("🔙返回清空報表", "clear_reports")
                 await query.edit_message_text(
-                    text,
-                    parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(keyboard)
+                    CLEAR_FLEET_TEXT,
+                    reply_markup=keyboard
                 )
 
         except Exception as e:
             logger.error(f"Error handling clear report: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回清空報表", callback_data="clear_reports")]]
+            keyboard = BotKeyboards.get_back_keyboard("🔙返回清空報表", "clear_reports")
             await query.edit_message_text(
                 "❌ 清空報表操作失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=keyboard
             )
 
-    async def _show_help_content(self, query, data):
+    async def _show_help_content(self, query, role):
         """Show help content for different user roles"""
-        try:
-            help_texts = {
-                "help_owner": """1️⃣ <b>群主指令</b>
-
-🔸 <b>完整權限</b>
-• 所有管理員和操作員功能
-• 🚯清空車隊總表 - 清空所有群組數據
-• 👤使用者設定 - 管理所有用戶權限
-
-🔸 <b>系統管理</b>
-• 設定匯率、歡迎詞等系統參數
-• 管理群組設定和權限分配""",
-
-                "help_admin": """2️⃣ <b>管理員指令</b>
-
-🔸 <b>報表管理</b>
-• 📊組別報表 - 查看和管理群組報表
-• 🚯清空組別報表 - 清空當前群組數據
-
-🔸 <b>用戶管理</b>
-• 👤使用者設定 - 管理操作員權限
-• 💱匯率設定 - 設定交易匯率""",
-
-                "help_operator": """3️⃣ <b>操作員指令</b>
-
-🔸 <b>報表指令</b>
-• 📊個人報表 - 顯示個人當月收支報表
-• 🚯清空個人報表 - 清空所有個人報表數據
-
-🔸 <b>記帳指令</b>
-• 💰金額異動 - 按鍵內的功能都可以使用
-
-🔸 <b>列表指令</b>
-• 列表 - 回覆訊息文本並輸入列表可格式化當前的文本內容""",
-
-
-            }
-
-            text = help_texts.get(data, "❌ 未知的幫助類型")
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=self.keyboards.get_command_help_keyboard()
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing help content: {e}")
-            await query.edit_message_text("❌ 顯示幫助內容失敗")
+        await self._safe_edit(
+            query, HELP_CONTENT_TEXTS.get(role, "❌ 未知的幫助類型"), self.keyboards.get_command_help_keyboard(),
+            "❌ 顯示幫助內容失敗"
+        )
 
-    async def _show_role_management(self, query, data):
+    async def _show_role_management(self, query, role):
         """Show role management for specific role"""
         try:
-            role_map = {
-                "role_owner": "群主",
-                "role_admin": "管理員", 
-                "role_operator": "操作員"
-            }
-
-            role_type = role_map.get(data, "未知")
+            role_type = ROLE_NAMES.get(role, "未知")
 
             text = f"""👤 <b>{role_type}管理</b>
 
@@ -1371,7 +1370,6 @@ class BotHandlers:
 
             await query.edit_message_text(
                 text,
-                parse_mode='HTML',
                 reply_markup=self.keyboards.get_role_management_keyboard(role_type)
             )
 
@@ -1381,119 +1379,35 @@ class BotHandlers:
 
     async def _show_tw_help(self, query):
         """Show Taiwan dollar transaction help"""
-        try:
-            text = """💰 <b>台幣記帳</b>
-
-請輸入交易格式：
-
-<b>台幣收入</b>
-<code>Tw+NN</code> <code>+NN</code>
-
-<b>台幣支出</b>
-<code>Tw-NN</code> <code>-NN</code>
-
-<b>指定日期</b>
-<code>MM/DD +NN</code> <code>MM/DD -NN</code>"""
-
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing TW help: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-            await query.edit_message_text(
-                "❌ 顯示台幣說明失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+        keyboard = BotKeyboards.get_back_keyboard("🔙返回金額異動", "money_actions")
+        await self._safe_edit(
+            query, TW_HELP_TEXT, keyboard,
+            "❌ 顯示台幣說明失敗", keyboard
+        )
 
     async def _show_cn_help(self, query):
         """Show Chinese yuan transaction help"""
-        try:
-            text = """💰 <b>人民幣記帳</b>
-
-請輸入交易格式：
-
-<b>人民幣收入</b>
-<code>Cn+NN</code> <code>+NN</code>
-
-<b>人民幣支出</b>
-<code>Cn-NN</code> <code>-NN</code>
-
-<b>指定日期</b>
-<code>MM/DD +NN</code> <code>MM/DD -NN</code>"""
-
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing CN help: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-            await query.edit_message_text(
-                "❌ 顯示人民幣說明失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+        keyboard = BotKeyboards.get_back_keyboard("🔙返回金額異動", "money_actions")
+        await self._safe_edit(
+            query, CN_HELP_TEXT, keyboard,
+            "❌ 顯示人民幣說明失敗", keyboard
+        )
 
     async def _show_public_fund_help(self, query):
         """Show public fund management help"""
-        try:
-            text = """💵 <b>公桶資金管理</b>
-
-<b>餘額:</b> <code>看當前的公桶餘額為多少</code>
-
-<b>操作格式：</b>
-<code>公桶+NN</code> <code>公桶-NN</code>"""
-
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing public fund help: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-            await query.edit_message_text(
-                "❌ 顯示公桶說明失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+        keyboard = BotKeyboards.get_back_keyboard("🔙返回金額異動", "money_actions")
+        await self._safe_edit(
+            query, PUBLIC_FUND_HELP_TEXT, keyboard,
+            "❌ 顯示公桶說明失敗", keyboard
+        )
 
     async def _show_private_fund_help(self, query):
         """Show private fund management help"""
-        try:
-            text = """💵 <b>私人資金管理</b>
-
-<b>餘額:</b> <code>看當前的私人餘額為多少</code>
-
-<b>操作格式：</b>
-<code>私人+NN</code> <code>私人-NN</code>"""
-
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-
-            await query.edit_message_text(
-                text,
-                parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-        except Exception as e:
-            logger.error(f"Error showing private fund help: {e}")
-            keyboard = [[InlineKeyboardButton("🔙返回金額異動", callback_data="money_actions")]]
-            await query.edit_message_text(
-                "❌ 顯示私人說明失敗",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+        keyboard = BotKeyboards.get_back_keyboard("🔙返回金額異動", "money_actions")
+        await self._safe_edit(
+            query, PRIVATE_FUND_HELP_TEXT, keyboard,
+            "❌ 顯示私人說明失敗", keyboard
+        )
 
     async def _handle_list_formatting(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle list formatting command"""
@@ -1547,7 +1461,7 @@ class BotHandlers:
                 return
 
             # Send formatted result
-            await update.message.reply_text(result['formatted_text'])
+            await update.message.reply_text(result['formatted_text'], parse_mode=None)
 
             logger.info(f"用戶 {update.effective_user.username or update.effective_user.id} 格式化了一條列表")
 
@@ -1560,44 +1474,42 @@ class BotHandlers:
         try:
             user = update.effective_user
             text = text.strip()
+            current_year = datetime.now().year
 
             # Parse delete command patterns
-            import re
-            from datetime import datetime, date
 
-            # Pattern for deleting specific date and amount: 刪除"MM/DD"TW100
-            date_amount_pattern = r'刪除["\'""]?(\d{1,2}/\d{1,2})["\'""]?(TW|CN)(\d+(?:\.\d+)?)'
-            match = re.search(date_amount_pattern, text)
+            # Deleting specific date and amount: 刪除"MM/DD"TW100, one or
+            # more per message, all removed in a single statement
+            matches = DELETE_RECORD_REGEX.findall(text)
 
-            if match:
-                date_str, currency, amount_str = match.groups()
+            if matches:
                 try:
-                    # Parse date
-                    month, day = map(int, date_str.split('/'))
-                    current_year = datetime.now().year
-                    target_date = date(current_year, month, day)
-
-                    # Parse amount
-                    amount = float(amount_str)
+                    # Parse dates and amounts
+                    rows = []
+                    for date_str, currency, amount_str in matches:
+                        month, day = map(int, date_str.split('/'))
+                        rows.append((date(current_year, month, day), currency, float(amount_str)))
 
-                    # Delete specific transaction
-                    success = await self.db.delete_transaction(
-                        user_id=user.id,
-                        transaction_date=target_date,
-                        currency=currency,
-                        amount=amount
-                    )
+                    # Delete the specific transactions
+                    deleted = await self.db.delete_transactions_bulk(user.id, rows)
 
-                    if success:
-                        currency_name = "台幣" if currency == "TW" else "人民幣"
+                    if deleted and len(rows) == 1:
+                        target_date, currency, amount = rows[0]
                         msg = f"""✅ <b>刪除記錄成功</b>
 
 📅 日期: {target_date.strftime('%m/%d')}
-💰 幣別: {currency_name}
+💰 幣別: {CURRENCY_NAMES[currency]}
 💵 金額: {amount:,.0f}
 👤 操作人: {user.first_name}
 """
-                        await update.message.reply_text(msg, parse_mode='HTML')
+                        await update.message.reply_text(msg)
+                    elif deleted:
+                        msg = f"""✅ <b>刪除記錄成功</b>
+
+🗑️ 已刪除: {deleted} 筆
+👤 操作人: {user.first_name}
+"""
+                        await update.message.reply_text(msg)
                     else:
                         await update.message.reply_text("❌ 找不到符合條件的記錄")
                     return
@@ -1606,15 +1518,13 @@ class BotHandlers:
                     await update.message.reply_text("❌ 日期或金額格式錯誤")
                     return
 
-            # Pattern for deleting monthly reports: 刪除"MM月"TW報表
-            monthly_pattern = r'刪除["\'""]?(\d{1,2})月["\'""]?(TW|CN)報表'
-            match = re.search(monthly_pattern, text)
+            # Deleting monthly reports: 刪除"MM月"TW報表
+            match = DELETE_MONTH_REGEX.search(text)
 
             if match:
                 month_str, currency = match.groups()
                 try:
                     month = int(month_str)
-                    current_year = datetime.now().year
 
                     # Delete monthly transactions
                     success = await self.db.delete_monthly_transactions(
@@ -1634,7 +1544,7 @@ class BotHandlers:
 
 ⚠️ 該月份的所有{currency_name}記錄已被刪除
 """
-                        await update.message.reply_text(msg, parse_mode='HTML')
+                        await update.message.reply_text(msg)
                     else:
                         await update.message.reply_text("❌ 該月份沒有找到記錄")
                     return
@@ -1644,21 +1554,7 @@ class BotHandlers:
                     return
 
             # If no pattern matches, show help
-            help_text = """❓ <b>刪除記錄指令格式</b>
-
-🔸 <b>刪除特定記錄</b>
-<code>刪除"日期"TW金額</code> - 刪除指定日期台幣記錄
-<code>刪除"日期"CN金額</code> - 刪除指定日期人民幣記錄
-
-🔸 <b>刪除月份記錄</b>
-<code>刪除"月份"TW報表</code> - 刪除整個月份的台幣記錄
-<code>刪除"月份"CN報表</code> - 刪除整個月份的人民幣記錄
-
-💡 <b>範例:</b>
-• <code>刪除"6/1"TW500</code> - 刪除6月1日台幣500元記錄
-• <code>刪除"6月"CN報表</code> - 刪除6月所有人民幣記錄
-"""
-            await update.message.reply_text(help_text, parse_mode='HTML')
+            await update.message.reply_text(DELETE_HELP_TEXT)
 
         except Exception as e:
             logger.error(f"Error handling delete commands: {e}")
@@ -1675,8 +1571,6 @@ class BotHandlers:
     async def _handle_fleet_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle fleet report generation"""
         try:
-            from datetime import datetime
-            import calendar
 
             now = datetime.now()
             year = now.year
@@ -1686,11 +1580,10 @@ class BotHandlers:
             chat = update.effective_chat
             user = update.effective_user
 
-            # Get current month's transactions from ALL groups for fleet report
-            transactions = await self.db.get_all_groups_transactions(month, year)
+            # Get current month's per-day income totals from ALL groups for fleet report
+            daily_totals = await self.db.get_fleet_daily_totals(year, month)
 
             # Get exchange rates for calculations from database
-            import timezone_utils
             today = timezone_utils.get_taiwan_today()
             today_rate = await self.db.get_exchange_rate(today)
             if not today_rate:
@@ -1699,8 +1592,8 @@ class BotHandlers:
             cn_rate = 7.2  # Default CNY rate
 
             # Calculate totals
-            tw_total = sum(t['amount'] for t in transactions if t['currency'] == 'TW' and t['transaction_type'] == 'income')
-            cn_total = sum(t['amount'] for t in transactions if t['currency'] == 'CN' and t['transaction_type'] == 'income')
+            tw_total = sum(row['tw'] for row in daily_totals)
+            cn_total = sum(row['cn'] for row in daily_totals)
 
             # Convert to USDT
             tw_usdt = (tw_total / today_rate)  if tw_total > 0 else 0
@@ -1708,16 +1601,11 @@ class BotHandlers:
 
             # Generate daily breakdown
             daily_data = {}
-            for transaction in transactions:
-                date_key = transaction['transaction_date'].strftime('%m/%d')
-                day_name = ['一', '二', '三', '四', '五', '六', '日'][transaction['transaction_date'].weekday()]
+            for row in daily_totals:
+                date_key = row['date'].strftime('%m/%d')
+                day_name = ['一', '二', '三', '四', '五', '六', '日'][row['date'].weekday()]
                 date_display = f"{date_key}({day_name})"
-
-                if date_display not in daily_data:
-                    daily_data[date_display] = {'TW': 0, 'CN': 0}
-
-                if transaction['transaction_type'] == 'income':
-                    daily_data[date_display][transaction['currency']] += transaction['amount']
+                daily_data[date_display] = {'TW': row['tw'], 'CN': row['cn']}
 
             # Format fleet report
             report = f"""【👀 North™Sea 北金國際 - {month_name}車隊報表】
@@ -1738,7 +1626,7 @@ class BotHandlers:
 --- <code>NT${amounts['TW']:,.0f}</code> → [<code>{daily_tw_usdt:,.2f}</code>]
 --- <code>CN¥{amounts['CN']:,.0f}</code> → [<code>{daily_cn_usdt:,.2f}</code>]"""
 
-            await update.message.reply_text(report, parse_mode='HTML')
+            await update.message.reply_text(report)
 
         except Exception as e:
             logger.error(f"Error generating fleet report: {e}")
@@ -1770,7 +1658,7 @@ class BotHandlers:
 
             user_list += f"📊 總計: {len(users)} 位用戶"
 
-            await update.message.reply_text(user_list, parse_mode='HTML')
+            await update.message.reply_text(user_list)
 
         except Exception as e:
             logger.error(f"Error showing user list: {e}")
@@ -1784,8 +1672,7 @@ class BotHandlers:
             if len(parts) < 2:
                 await update.message.reply_text(
                     "❓ 請指定要查找的用戶名\n\n"
-                    "格式: <code>查找用戶 @M8-N3</code>",
-                    parse_mode='HTML'
+                    "格式: <code>查找用戶 @M8-N3</code>"
                 )
                 return
 
@@ -1801,9 +1688,9 @@ class BotHandlers:
 👋 名字: {user.get('first_name', '未設定')}
 📅 加入時間: {user.get('created_at', '未知').split(' ')[0] if user.get('created_at') else '未知'}
 """
-                await update.message.reply_text(user_info, parse_mode='HTML')
+                await update.message.reply_text(user_info)
             else:
-                await update.message.reply_text(f"❌ 找不到用戶: @{username}")
+                await update.message.reply_text(f"❌ 找不到用戶: @{username}", parse_mode=None)
 
         except Exception as e:
             logger.error(f"Error finding user: {e}")
@@ -1812,8 +1699,6 @@ class BotHandlers:
     def _parse_financial_record(self, text: str) -> Optional[Dict]:
         """解析金融記錄訊息格式，支援群主代記帳功能和日期參數"""
         try:
-            import re
-            from datetime import datetime, date
 
             # 首先檢查是否包含必要的項目和金額欄位
             if not ('項目' in text and '金額' in text):
@@ -2018,7 +1903,7 @@ class BotHandlers:
 📊 今日總計：{daily_total:,}
 📊 本月總計：{monthly_total:,}"""
 
-                await update.message.reply_text(response_msg)
+                await update.message.reply_text(response_msg, parse_mode=None)
             else:
                 await update.message.reply_text("❌ 記帳失敗，請稍後再試")
 
@@ -2028,105 +1913,19 @@ class BotHandlers:
 
     async def _get_daily_total(self, user_id: int, group_id: int, target_date: date) -> int:
         """獲取指定日期的總計"""
-        try:
-            from decimal import Decimal
-
-            def safe_float(value):
-                """安全轉換為 float"""
-                if isinstance(value, Decimal):
-                    return float(value)
-                elif isinstance(value, (int, float)):
-                    return float(value)
-                return 0.0
-
-            # 檢查是否使用PostgreSQL
-            if hasattr(self.db, 'get_connection') and hasattr(self.db, '_lock'):
-                # PostgreSQL (Railway)
-                async with self.db._lock:
-                    conn = self.db.get_connection()
-                    try:
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                        SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) as total 
-                        FROM transactions 
-                        WHERE group_id = %s AND date = %s
-                        """, (group_id, target_date))
-                        result = cursor.fetchone()
-                        total = safe_float(result['total']) if result and result['total'] else 0.0
-                        logger.info(f"Daily total for group {group_id} on {target_date}: {total}")
-                        return int(total)
-                    finally:
-                        conn.close()
-            else:
-                # SQLite (local)
-                async with self.db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) as total 
-                    FROM transactions 
-                    WHERE group_id = ? AND date = ?
-                    """, (group_id, target_date))
-                    result = cursor.fetchone()
-                    total = safe_float(result[0]) if result and result[0] else 0.0
-                    logger.info(f"Daily total for group {group_id} on {target_date}: {total}")
-                    return int(total)
-        except Exception as e:
-            logger.error(f"Error getting daily total: {e}")
-            return 0
+        total = await self.db.get_group_daily_total(group_id, target_date)
+        logger.info("Daily total for group %s on %s: %s", group_id, target_date, total)
+        return int(total)
 
     async def _get_monthly_total(self, user_id: int, group_id: int, year: int, month: int) -> int:
         """獲取指定月份的總計"""
-        try:
-            from decimal import Decimal
-
-            def safe_float(value):
-                """安全轉換為 float"""
-                if isinstance(value, Decimal):
-                    return float(value)
-                elif isinstance(value, (int, float)):
-                    return float(value)
-                return 0.0
-
-            # 檢查是否使用PostgreSQL
-            if hasattr(self.db, 'get_connection') and hasattr(self.db, '_lock'):
-                # PostgreSQL (Railway)
-                async with self.db._lock:
-                    conn = self.db.get_connection()
-                    try:
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                        SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) as total 
-                        FROM transactions 
-                        WHERE group_id = %s AND EXTRACT(YEAR FROM date) = %s AND EXTRACT(MONTH FROM date) = %s
-                        """, (group_id, year, month))
-                        result = cursor.fetchone()
-                        total = safe_float(result['total']) if result and result['total'] else 0.0
-                        logger.info(f"Monthly total for group {group_id} in {year}-{month:02d}: {total}")
-                        return int(total)
-                    finally:
-                        conn.close()
-            else:
-                # SQLite (local)
-                async with self.db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) as total 
-                    FROM transactions 
-                    WHERE group_id = ? AND strftime('%Y', date) = ? AND strftime('%m', date) = ?
-                    """, (group_id, str(year), f"{month:02d}"))
-                    result = cursor.fetchone()
-                    total = safe_float(result[0]) if result and result[0] else 0.0
-                    logger.info(f"Monthly total for group {group_id} in {year}-{month:02d}: {total}")
-                    return int(total)
-        except Exception as e:
-            logger.error(f"Error getting monthly total: {e}")
-            return 0
+        total = await self.db.get_group_monthly_total(group_id, year, month)
+        logger.info("Monthly total for group %s in %d-%02d: %s", group_id, year, month, total)
+        return int(total)
 
     async def _show_daily_payout_report(self, query):
         """Show daily payout report"""
         try:
-            import timezone_utils
-            from datetime import datetime
 
             chat = query.message.chat
             today = timezone_utils.get_taiwan_today()
@@ -2137,7 +1936,6 @@ class BotHandlers:
             logger.info(f"Found {len(transactions)} transactions for date {today}")
 
             # 計算總出款 (正數為收入，負數為支出)
-            from decimal import Decimal
 
             def safe_float(value):
                 """安全轉換為 float"""
@@ -2163,7 +1961,6 @@ class BotHandlers:
 
                             # 檢查描述中是否有出款人信息
                             if '出款人:' in description:
-                                import re
                                 match = re.search(r'出款人:\s*([^|]+)', description)
                                 if match:
                                     user_display = match.group(1).strip()
@@ -2193,7 +1990,6 @@ class BotHandlers:
 
             # 添加時間戳和隨機要素確保內容唯一性
             current_time = timezone_utils.get_taiwan_now().strftime('%H:%M:%S')
-            import random
             unique_id = random.randint(100, 999)
 
             report = f"""<b>◉ 本日總出款</b>
@@ -2216,7 +2012,6 @@ class BotHandlers:
             keyboard = self.keyboards.get_payout_report_keyboard()
             await query.edit_message_text(
                 report,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -2227,15 +2022,13 @@ class BotHandlers:
             keyboard = BotKeyboards.get_main_inline_keyboard()
             await query.edit_message_text(
                 text=error_msg,
-                reply_markup=keyboard
+                reply_markup=keyboard,
+                parse_mode=None
             )
 
     async def _show_monthly_payout_report(self, query):
         """Show monthly payout report"""
         try:
-            from datetime import datetime
-            import timezone_utils
-            from decimal import Decimal
 
             def safe_float(value):
                 """安全轉換為 float"""
@@ -2274,7 +2067,6 @@ class BotHandlers:
 
             # 生成月度報表
             current_time = timezone_utils.get_taiwan_now().strftime('%H:%M:%S')
-            import random
             unique_id = random.randint(100, 999)
 
             report = f"""<b>◉ 本月總出款</b>
@@ -2291,7 +2083,6 @@ class BotHandlers:
                     transaction_date = t.get('transaction_date') or t.get('date')
                     if isinstance(transaction_date, str):
                         try:
-                            from datetime import datetime
                             transaction_date = datetime.strptime(transaction_date, '%Y-%m-%d').date()
                         except ValueError:
                             continue
@@ -2342,7 +2133,6 @@ class BotHandlers:
             keyboard = self.keyboards.get_payout_report_keyboard()
             await query.edit_message_text(
                 report,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -2352,7 +2142,8 @@ class BotHandlers:
             keyboard = BotKeyboards.get_main_inline_keyboard()
             await query.edit_message_text(
                 text=error_msg,
-                reply_markup=keyboard
+                reply_markup=keyboard,
+                parse_mode=None
             )
 
     async def _handle_clear_report_date_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, date_input: str):
@@ -2410,7 +2201,6 @@ class BotHandlers:
 
             await update.message.reply_text(
                 confirmation_text,
-                parse_mode='HTML',
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
 
@@ -2427,7 +2217,6 @@ class BotHandlers:
         await query.edit_message_text(
             text="💱 <b>匯率設定選單</b>\n\n"
                  "請選擇要執行的匯率操作：",
-            parse_mode='HTML',
             reply_markup=keyboard
         )
 
@@ -2465,7 +2254,6 @@ class BotHandlers:
             keyboard = BotKeyboards.get_exchange_rate_keyboard()
             await query.edit_message_text(
                 text=rate_info,
-                parse_mode='HTML',
                 reply_markup=keyboard
             )
 
@@ -2478,98 +2266,47 @@ class BotHandlers:
 
     async def _prompt_tw_rate_setting(self, query):
         """Prompt user to set Taiwan dollar exchange rate"""
-        prompt_text = """💰 <b>設定台幣匯率</b>
-
-請直接輸入以下格式的指令：
-
-🔹 <b>設定今日匯率:</b>
-   <code>設定匯率30.5</code>
-
-🔹 <b>設定指定日期匯率:</b>
-   <code>設定06/01匯率30.2</code>
-
-⚠️ 需要管理員權限才能設定匯率"""
-
         keyboard = BotKeyboards.get_exchange_rate_keyboard()
         await query.edit_message_text(
-            text=prompt_text,
-            parse_mode='HTML',
+            text=TW_RATE_PROMPT_TEXT,
             reply_markup=keyboard
         )
 
     async def _prompt_cn_rate_setting(self, query):
         """Prompt user to set Chinese yuan exchange rate"""
-        prompt_text = """💴 <b>設定人民幣匯率</b>
-
-請直接輸入以下格式的指令：
-
-🔹 <b>設定今日匯率:</b>
-   <code>設定CN匯率7.2</code>
-
-🔹 <b>設定指定日期匯率:</b>
-   <code>設定06/01CN匯率7.1</code>
-
-⚠️ 需要管理員權限才能設定匯率"""
-
         keyboard = BotKeyboards.get_exchange_rate_keyboard()
         await query.edit_message_text(
-            text=prompt_text,
-            parse_mode='HTML',
+            text=CN_RATE_PROMPT_TEXT,
             reply_markup=keyboard
         )
 
     async def _prompt_date_rate_setting(self, query):
         """Prompt user to set exchange rate for specific date"""
-        prompt_text = """📅 <b>設定指定日期匯率</b>
-
-支援以下日期格式的匯率設定：
-
-🔹 <b>台幣匯率:</b>
-   <code>設定06/01匯率30.2</code>
-   <code>設定2024-06-01匯率30.2</code>
-
-🔹 <b>人民幣匯率:</b>
-   <code>設定06/01CN匯率7.1</code>
-   <code>設定2024-06-01CN匯率7.1</code>
-
-📝 <b>日期格式說明:</b>
-• MM/DD - 當年月日
-• YYYY-MM-DD - 完整日期
-• MM月DD日 - 中文格式
-
-⚠️ 需要管理員權限才能設定匯率"""
-
         keyboard = BotKeyboards.get_exchange_rate_keyboard()
         await query.edit_message_text(
-            text=prompt_text,
-            parse_mode='HTML',
+            text=DATE_RATE_PROMPT_TEXT,
             reply_markup=keyboard
         )
 
     # Handler getter methods for main application
     def get_start_handler(self):
         """Get start command handler"""
-        from telegram.ext import CommandHandler
         return CommandHandler("start", self.start_command)
 
     def get_help_handler(self):
         """Get help command handler"""
-        from telegram.ext import CommandHandler
         return CommandHandler("help", self.help_command)
 
     def get_restart_handler(self):
         """Get restart command handler"""
-        from telegram.ext import CommandHandler
         return CommandHandler("restart", self.restart_command)
 
     def get_message_handler(self):
         """Get message handler"""
-        from telegram.ext import MessageHandler, filters
         return MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_transaction_message)
 
     def get_callback_handler(self):
         """Get callback query handler"""
-        from telegram.ext import CallbackQueryHandler
         return CallbackQueryHandler(self.callback_query_handler)
 
     def get_error_handler(self):
@@ -3,10 +3,14 @@ Keyboard layouts for the North Sea Financial Bot
 Defines inline and reply keyboards for user interaction
 """
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from functools import lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 
 class BotKeyboards:
+    # Markups are immutable, so every layout is built once and then shared
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_main_inline_keyboard():
         """Get main inline keyboard with updated layout"""
         keyboard = [
@@ -22,6 +26,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_currency_keyboard():
         """Get currency selection keyboard"""
         keyboard = [
@@ -33,6 +38,7 @@ class BotKeyboards:
         return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_personal_report_keyboard():
         """Get personal report keyboard"""
         keyboard = [
@@ -47,6 +53,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_group_report_keyboard():
         """Get group report keyboard"""
         keyboard = [
@@ -61,6 +68,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_fleet_report_keyboard():
         """Get fleet report keyboard"""
         keyboard = [
@@ -75,6 +83,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_report_type_keyboard():
         """Get report type selection keyboard"""
         keyboard = [
@@ -93,6 +102,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_money_actions_keyboard():
         """Get money actions keyboard"""
         keyboard = [
@@ -111,6 +121,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_report_display_keyboard():
         """Get report display keyboard"""
         keyboard = [
@@ -130,6 +141,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_settings_menu_keyboard():
         """Get settings menu keyboard"""
         keyboard = [
@@ -148,6 +160,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_exchange_rate_keyboard():
         """Get exchange rate settings keyboard"""
         keyboard = [
@@ -168,6 +181,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_command_help_keyboard():
         """Get command help keyboard"""
         keyboard = [
@@ -185,6 +199,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_clear_reports_keyboard():
         """Get clear reports keyboard"""
         keyboard = [
@@ -204,6 +219,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_user_settings_keyboard():
         """Get user settings keyboard"""
         keyboard = [
@@ -219,6 +235,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_role_management_keyboard(role_type: str):
         """Get role management keyboard for specific role"""
         keyboard = [
@@ -234,11 +251,13 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_settings_keyboard():
         """Get legacy settings keyboard for compatibility"""
         return BotKeyboards.get_settings_menu_keyboard()
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_fund_management_keyboard():
         """Get fund management keyboard"""
         keyboard = [
@@ -261,6 +280,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_confirmation_keyboard(action: str):
         """Get confirmation keyboard for dangerous operations"""
         keyboard = [
@@ -272,6 +292,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_month_selection_keyboard():
         """Get month selection keyboard"""
         keyboard = []
@@ -294,6 +315,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_admin_keyboard():
         """Get admin-only keyboard"""
         keyboard = [
@@ -312,6 +334,7 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
     
     @staticmethod
+    @lru_cache(maxsize=None)
     def get_payout_report_keyboard():
         """Get payout report keyboard"""
         keyboard = [
@@ -326,7 +349,14 @@ class BotKeyboards:
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
+    @lru_cache(maxsize=None)
+    def get_back_keyboard(text: str, callback_data: str):
+        """Get a single back button keyboard"""
+        keyboard = [[InlineKeyboardButton(text, callback_data=callback_data)]]
+        return InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
     def remove_keyboard():
         """Remove reply keyboard"""
-        from telegram import ReplyKeyboardRemove
         return ReplyKeyboardRemove()
\ No newline at end of file
@@ -7,7 +7,7 @@ Simple polling mode version
 import logging
 import os
 from bot import create_bot
-from database import DatabaseManager
+from database import get_db_manager
 import config
 import timezone_utils
 
@@ -48,7 +48,7 @@ def main():
         logger.info("🚀 Starting 北金管家 North™Sea ᴍ8ᴘ in simple polling mode...")
         
         # Initialize database
-        db_manager = DatabaseManager()
+        db_manager = get_db_manager()
         
         # Create bot application
         application = create_bot()
@@ -9,7 +9,7 @@ import logging
 import os
 from datetime import datetime
 from bot import create_bot
-from database import DatabaseManager
+from database import get_db_manager
 from config import BOT_TOKEN, GROUP_ID
 
 # Configure logging
@@ -47,7 +47,7 @@ async def main():
         logger.info("🚀 Starting 北金管家 North™Sea ᴍ8ᴘ in polling mode...")
         
         # Initialize database
-        db_manager = DatabaseManager()
+        db_manager = get_db_manager()
         
         # Create bot application
         application = create_bot()
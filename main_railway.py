@@ -26,7 +26,8 @@ logger = logging.getLogger(__name__)
 import timezone_utils
 timezone_utils.setup_timezone()
 
-from telegram.ext import Application
+from telegram.constants import ParseMode
+from telegram.ext import Application, Defaults
 from handlers import BotHandlers
 from keyboards import BotKeyboards
 import config
@@ -74,7 +75,16 @@ def main():
         if not bot_token:
             raise ValueError("BOT_TOKEN not found in environment variables")
         
-        application = Application.builder().token(bot_token).post_init(post_init).build()
+        # Replies are HTML unless a handler passes parse_mode=None
+        application = (
+            Application.builder()
+            .token(bot_token)
+            .defaults(Defaults(parse_mode=ParseMode.HTML))
+            .connection_pool_size(config.TELEGRAM_CONNECTION_POOL_SIZE)
+            .pool_timeout(config.TELEGRAM_POOL_TIMEOUT)
+            .post_init(post_init)
+            .build()
+        )
         
         # Initialize handlers
         handlers = BotHandlers(db_manager)
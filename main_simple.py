@@ -7,7 +7,7 @@ Simple polling mode version
 import logging
 import os
 from bot import create_bot
-from database import DatabaseManager
+from database import get_db_manager
 from config import BOT_TOKEN, GROUP_ID
 
 # Configure logging
@@ -45,7 +45,7 @@ def main():
         logger.info("🚀 Starting 北金管家 North™Sea ᴍ8ᴘ in simple polling mode...")
         
         # Initialize database
-        db_manager = DatabaseManager()
+        db_manager = get_db_manager()
         
         # Create bot application
         application = create_bot()
@@ -10,7 +10,7 @@ import os
 from aiohttp import web
 from telegram import Update
 from bot import create_bot
-from database import DatabaseManager
+from database import get_db_manager
 from config import GROUP_ID
 
 # 設置日誌
@@ -83,7 +83,7 @@ async def main():
     
     try:
         # 初始化資料庫
-        db_manager = DatabaseManager()
+        db_manager = get_db_manager()
         
         # 創建機器人應用程式
         application = create_bot()
@@ -1,33 +1,18 @@
 """
 Fixed report formatting functions with comprehensive error handling
 """
-from datetime import datetime
+import html
+from datetime import datetime, date
 from typing import List, Dict
-from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
 
-def safe_float(value):
-    """Safely convert any numeric value to float"""
-    try:
-        if isinstance(value, Decimal):
-            return float(value)
-        elif isinstance(value, (int, float)):
-            return float(value)
-        elif hasattr(value, '__float__'):
-            return float(value)
-        elif isinstance(value, str):
-            return float(value)
-        return 0.0
-    except (ValueError, TypeError):
-        return 0.0
-
 async def format_new_group_report(transactions: List[Dict], group_name: str = "群組", db_manager=None) -> str:
     """Format group financial report with comprehensive error handling"""
     try:
         if not transactions:
-            return f"📊 <b>{group_name}報表</b>\n\n❌ 本月暫無交易記錄"
+            return f"📊 <b>{html.escape(group_name)}報表</b>\n\n❌ 本月暫無交易記錄"
         
         # Calculate overall totals with safe conversion
         overall_totals = {'TW': 0.0, 'CN': 0.0}
@@ -35,82 +20,30 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
             try:
                 if t.get('transaction_type') == 'income':
                     currency = str(t.get('currency', ''))
-                    amount = safe_float(t.get('amount', 0))
+                    amount = t.get('amount') or 0.0
                     if currency in overall_totals:
                         overall_totals[currency] += amount
             except Exception as e:
                 logger.warning(f"Error processing transaction: {e}")
                 continue
         
-        # Calculate USDT totals using daily rates
-        tw_usdt_total = 0.0
-        cn_usdt_total = 0.0
-        
-        # Group transactions by date for USDT calculation
-        daily_totals = {}
-        for t in transactions:
-            try:
-                if t.get('transaction_type') != 'income':
-                    continue
-                    
-                date_str = t.get('date')
-                if isinstance(date_str, str):
-                    try:
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    except ValueError:
-                        try:
-                            date_obj = datetime.fromisoformat(str(date_str)).date()
-                        except ValueError:
-                            continue
-                else:
-                    date_obj = date_str
-                
-                day_key = date_obj.strftime('%m/%d')
-                
-                if day_key not in daily_totals:
-                    daily_totals[day_key] = {'TW': 0.0, 'CN': 0.0}
-                
-                currency = str(t.get('currency', ''))
-                amount = safe_float(t.get('amount', 0))
-                
-                if currency in daily_totals[day_key]:
-                    daily_totals[day_key][currency] += amount
-                    
-            except Exception as e:
-                logger.warning(f"Error processing daily transaction: {e}")
-                continue
+        # Look up the names of users without a display_name in one batch
+        user_names = {}
+        if db_manager:
+            user_ids = {t.get('user_id') for t in transactions
+                        if not t.get('display_name') and t.get('user_id')}
+            if user_ids:
+                user_names = await db_manager.get_user_display_names(user_ids)
         
-        # Calculate USDT totals using specific daily rates
-        for day_key, amounts in daily_totals.items():
-            try:
-                # Use mock rates for demonstration (replace with actual rates)
-                day_tw_rate = 33.33 if day_key == '06/01' else 30.0
-                day_cn_rate = 7.5 if day_key == '06/01' else 7.0
-                
-                tw_usdt_total += amounts['TW'] / day_tw_rate if amounts['TW'] > 0 else 0
-                cn_usdt_total += amounts['CN'] / day_cn_rate if amounts['CN'] > 0 else 0
-            except Exception as e:
-                logger.warning(f"Error calculating USDT for {day_key}: {e}")
-                continue
-        
-        # Build report header with proper formatting
-        report_lines = [
-            f"<b>👀{group_name}  2025年6月群組報表</b>",
-            "<b>◉ 台幣業績</b>",
-            f"<code>NT${overall_totals['TW']:,.0f}</code> → <code>USDT${tw_usdt_total:,.2f}</code>",
-            "<b>◉ 人民幣業績</b>", 
-            f"<code>CN¥{overall_totals['CN']:,.0f}</code> → <code>USDT${cn_usdt_total:,.2f}</code>",
-            "_____________________________"
-        ]
-        
-        # Add daily transaction details
+        # Add daily transaction details, keeping each day's date for the rate lookup
         daily_transactions = {}
+        daily_dates = {}
         for t in transactions:
             try:
                 date_str = t.get('date')
                 if isinstance(date_str, str):
                     try:
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+                        date_obj = date.fromisoformat(date_str)
                     except ValueError:
                         try:
                             date_obj = datetime.fromisoformat(str(date_str)).date()
@@ -119,24 +52,25 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
                 else:
                     date_obj = date_str
                 
-                day_key = date_obj.strftime('%m/%d')
+                day_key = f"{date_obj.month:02d}/{date_obj.day:02d}"
                 
                 if day_key not in daily_transactions:
                     daily_transactions[day_key] = []
+                    daily_dates[day_key] = date_obj
                 
                 # Get user display name - prioritize display_name from transaction data
                 user_name = t.get('display_name')
                 if not user_name:
                     user_id = t.get('user_id')
                     if db_manager and user_id:
-                        user_name = await db_manager.get_user_display_name(user_id)
+                        user_name = user_names.get(user_id, f"User{user_id}")
                     if not user_name:
                         user_name = (t.get('username') or 
                                    t.get('first_name') or 
                                    f"User{user_id}" if user_id else "Unknown")
                 
                 transaction_entry = {
-                    'amount': safe_float(t.get('amount', 0)),
+                    'amount': t.get('amount') or 0.0,
                     'currency': str(t.get('currency', '')),
                     'user': str(user_name),
                     'type': str(t.get('transaction_type', '')),
@@ -149,7 +83,18 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
                 logger.warning(f"Error processing transaction for daily view: {e}")
                 continue
         
-        # Add daily summaries in the exact format requested
+        # Look up every day's rates in one query before the daily loop
+        if db_manager:
+            rates_by_day = await db_manager.get_exchange_rates_for_dates(list(daily_dates.values()))
+        else:
+            rates_by_day = {}
+        default_rates = {'TWD': 30.0, 'CNY': 7.0}
+        
+        # Add daily summaries in the exact format requested, totalling the
+        # header's USDT figures from the same daily rates
+        tw_usdt_total = 0.0
+        cn_usdt_total = 0.0
+        daily_lines = []
         for day_key in sorted(daily_transactions.keys()):
             try:
                 day_trans = daily_transactions[day_key]
@@ -158,19 +103,19 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
                 tw_daily = sum(t['amount'] for t in day_trans if t['currency'] == 'TW' and t['type'] == 'income')
                 cn_daily = sum(t['amount'] for t in day_trans if t['currency'] == 'CN' and t['type'] == 'income')
                 
-                # Get daily exchange rates from database using proper date
-                from datetime import datetime
-                date_obj = datetime.strptime(f"2025-{day_key}", "%Y-%m/%d").date()
-                day_rates = await db_manager.get_latest_exchange_rates(date_obj) if db_manager else {'TWD': 30.0, 'CNY': 7.0}
+                # Daily exchange rates fetched above
+                day_rates = rates_by_day.get(daily_dates[day_key], default_rates)
                 day_tw_rate = day_rates.get('TWD', 30.0)
                 day_cn_rate = day_rates.get('CNY', 7.0)
                 
                 # Calculate USDT equivalents
                 tw_daily_usdt = tw_daily / day_tw_rate if tw_daily > 0 else 0
                 cn_daily_usdt = cn_daily / day_cn_rate if cn_daily > 0 else 0
+                tw_usdt_total += tw_daily_usdt
+                cn_usdt_total += cn_daily_usdt
                 
                 # Add date header with exchange rates formatted to 2 decimal places for TWD
-                report_lines.append(f"<b>{day_key} 台幣匯率{day_tw_rate:.2f} 人民幣匯率{day_cn_rate:.1f}</b>")
+                daily_lines.append(f"<b>{day_key} 台幣匯率{day_tw_rate:.2f} 人民幣匯率{day_cn_rate:.1f}</b>")
                 
                 # Add daily totals line
                 daily_line = ""
@@ -182,7 +127,7 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
                     daily_line += f"<code>CN¥{cn_daily:,.0f}({cn_daily_usdt:,.2f})</code>"
                 
                 if daily_line:
-                    report_lines.append(daily_line)
+                    daily_lines.append(daily_line)
                 
                 # Group transactions by user for this day
                 user_transactions = {}
@@ -202,23 +147,29 @@ async def format_new_group_report(transactions: List[Dict], group_name: str = "
                         if amounts['TW'] > 0:
                             user_line += "  "
                         user_line += f"<code>CN¥{amounts['CN']:,.0f}</code>"
-                    user_line += f" <code>{user}</code>"
-                    report_lines.append(user_line)
+                    user_line += f" <code>{html.escape(user)}</code>"
+                    daily_lines.append(user_line)
                 
-                report_lines.append("")  # Add spacing between days
+                daily_lines.append("")  # Add spacing between days
                 
             except Exception as e:
                 logger.warning(f"Error formatting daily summary for {day_key}: {e}")
                 continue
         
-        # Ensure HTML tags remain lowercase to prevent Telegram parsing issues
-        final_report = "\n".join(report_lines)
-        
-        # Fix any corrupted HTML tags using utility function
-        from utils import fix_html_tags
-        final_report = fix_html_tags(final_report)
+        # Build report header with proper formatting
+        report_lines = [
+            f"<b>👀{html.escape(group_name)}  2025年6月群組報表</b>",
+            "<b>◉ 台幣業績</b>",
+            f"<code>NT${overall_totals['TW']:,.0f}</code> → <code>USDT${tw_usdt_total:,.2f}</code>",
+            "<b>◉ 人民幣業績</b>", 
+            f"<code>CN¥{overall_totals['CN']:,.0f}</code> → <code>USDT${cn_usdt_total:,.2f}</code>",
+            "_____________________________",
+            *daily_lines
+        ]
         
-        return final_report
+        # Every tag above is emitted in balanced pairs and names are escaped,
+        # so the report needs no fix-up pass
+        return "\n".join(report_lines)
         
     except Exception as e:
         logger.error(f"Error formatting group report: {e}")
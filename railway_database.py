@@ -3,53 +3,151 @@ Railway PostgreSQL database management for North Sea Financial Bot
 Handles PostgreSQL database operations for Railway deployment - Fixed version
 """
 
+import asyncio
+import functools
 import os
+import urllib.parse as urlparse
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 import logging
+from contextlib import contextmanager
 from datetime import datetime, date
-from typing import List, Dict, Optional
-import asyncio
+from typing import List, Dict, Optional, Tuple
 from decimal import Decimal
 
+from database import month_range, rates_by_date
+import config
+
 logger = logging.getLogger(__name__)
 
+# Connection pool bounds
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = config.DB_POOL_SIZE
+
+# Hot-path statements prepared server-side once per connection
+PREPARED_STATEMENTS = (
+    """
+    PREPARE add_user_stmt (BIGINT, VARCHAR, VARCHAR, VARCHAR, VARCHAR) AS
+    INSERT INTO users (user_id, username, display_name, first_name, last_name)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (user_id) 
+    DO UPDATE SET 
+        username = EXCLUDED.username,
+        display_name = EXCLUDED.display_name,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        updated_at = CURRENT_TIMESTAMP
+    """,
+    """
+    PREPARE add_transaction_stmt (BIGINT, BIGINT, DATE, VARCHAR, DECIMAL, VARCHAR, BIGINT, TEXT) AS
+    INSERT INTO transactions (user_id, group_id, date, currency, amount, transaction_type, created_by, description)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    """,
+)
+
+# NUMERIC/DECIMAL columns are read as float, the type the rest of the bot works in
+DECIMAL_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'DECIMAL_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+def run_in_pool_thread(method):
+    """Run a blocking psycopg2 method in a worker thread, at most one per
+    pooled connection, so queries don't stall the event loop"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        async with self._pool_slots:
+            return await asyncio.to_thread(method, self, *args, **kwargs)
+    return wrapper
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that reads NUMERIC as float and records whether
+    PREPARED_STATEMENTS exist in its session"""
+    prepared = False
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        psycopg2.extensions.register_type(DECIMAL_AS_FLOAT, self)
+
 class RailwayDatabaseManager:
     def __init__(self):
         self.database_url = os.getenv('DATABASE_URL')
         if not self.database_url:
             raise Exception("DATABASE_URL environment variable not found")
         
-        self._lock = asyncio.Lock()
+        self._group_name_cache: Dict[int, str] = {}
+        self._user_name_cache: Dict[int, str] = {}
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **self._connection_params()
+        )
+        # getconn raises instead of waiting once the pool is exhausted, so
+        # worker threads queue here for a free connection
+        self._pool_slots = asyncio.Semaphore(POOL_MAX_CONNECTIONS)
         self.init_database()
         logger.info("✅ Railway PostgreSQL database initialized successfully")
     
-    def get_connection(self):
-        """Get database connection"""
+    def _connection_params(self) -> Dict:
+        """Build psycopg2 connection arguments from DATABASE_URL"""
         if not self.database_url:
             raise Exception("DATABASE_URL not available")
         
         # Parse the DATABASE_URL properly for Railway
-        import urllib.parse as urlparse
-        
         # Parse the URL
         url = urlparse.urlparse(self.database_url)
         
-        return psycopg2.connect(
+        return dict(
             host=url.hostname,
             port=url.port,
             user=url.username,
             password=url.password,
             database=url.path[1:],  # Remove leading slash
             cursor_factory=psycopg2.extras.RealDictCursor,
+            connection_factory=PreparedConnection,
             sslmode='require'  # Required for Railway PostgreSQL
         )
     
+    def get_connection(self):
+        """Get a new, unpooled database connection"""
+        return psycopg2.connect(**self._connection_params())
+    
+    @contextmanager
+    def acquire(self):
+        """Borrow a connection from the pool and return it when done"""
+        conn = self._pool.getconn()
+        try:
+            yield conn
+        finally:
+            broken = bool(conn.closed)
+            if not broken:
+                try:
+                    # Drop any open transaction so the next borrower starts clean
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self._pool.putconn(conn, close=broken)
+    
+    def close(self):
+        """Close all pooled connections"""
+        self._pool.closeall()
+    
+    def _ensure_prepared(self, conn):
+        """Prepare PREPARED_STATEMENTS on a connection the first time it is used"""
+        if conn.prepared:
+            return
+        cursor = conn.cursor()
+        # Clear leftovers from an earlier attempt that failed part-way
+        cursor.execute("DEALLOCATE ALL")
+        for statement in PREPARED_STATEMENTS:
+            cursor.execute(statement)
+        conn.commit()
+        conn.prepared = True
+    
     def init_database(self):
         """Initialize database tables"""
         try:
-            conn = self.get_connection()
-            try:
+            with self.acquire() as conn:
                 cursor = conn.cursor()
                 
                 # Users table
@@ -118,478 +216,628 @@ class RailwayDatabaseManager:
                 )
                 """)
                 
+                # Index for most-recent-first listings
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_created_at
+                ON transactions (created_at DESC)
+                """)
+                
+                # Composite indexes matching the user/group/month report queries;
+                # (user_id, group_id, date) also serves plain user_id lookups.
+                # fund_balances is already covered by its UNIQUE constraint.
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_user_group_date
+                ON transactions (user_id, group_id, date DESC)
+                """)
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_group_date
+                ON transactions (group_id, date DESC)
+                """)
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tx_date
+                ON transactions (date)
+                """)
+                
+                # Covering index: rate lookups are answered from the index alone
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_ex_currency_date_rate
+                ON exchange_rates (currency, date DESC) INCLUDE (rate)
+                """)
+                
                 conn.commit()
                 logger.info("✅ Railway PostgreSQL database initialized successfully")
-                
-            finally:
-                conn.close()
         except Exception as e:
             logger.error(f"❌ Error initializing Railway database: {e}")
             raise
     
-    async def set_exchange_rate(self, rate_date: date, rate: float, set_by: int, currency: str = 'TW') -> bool:
+    @run_in_pool_thread
+    def set_exchange_rate(self, rate_date: date, rate: float, set_by: int, currency: str = 'TW') -> bool:
         """Set exchange rate for a specific date and currency"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO exchange_rates (date, currency, rate, set_by)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (date, currency) 
-                    DO UPDATE SET rate = EXCLUDED.rate, set_by = EXCLUDED.set_by, created_at = CURRENT_TIMESTAMP
-                    """, (rate_date, currency, rate, set_by))
-                    conn.commit()
-                    logger.info(f"✅ Exchange rate set successfully: {rate_date} {currency} = {rate}")
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                INSERT INTO exchange_rates (date, currency, rate, set_by)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (date, currency) 
+                DO UPDATE SET rate = EXCLUDED.rate, set_by = EXCLUDED.set_by, created_at = CURRENT_TIMESTAMP
+                """, (rate_date, currency, rate, set_by))
+                conn.commit()
+                logger.info(f"✅ Exchange rate set successfully: {rate_date} {currency} = {rate}")
+                return True
         except Exception as e:
             logger.error(f"❌ Error setting exchange rate: {e}")
             logger.error(f"Details: rate_date={rate_date}, currency={currency}, rate={rate}, set_by={set_by}")
             return False
     
-    async def get_exchange_rate(self, rate_date: date = None, currency: str = 'TW') -> Optional[float]:
+    @run_in_pool_thread
+    def get_exchange_rate(self, rate_date: date = None, currency: str = 'TW') -> Optional[float]:
         """Get exchange rate for a specific date and currency"""
         try:
             if not rate_date:
                 rate_date = date.today()
             
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    SELECT rate FROM exchange_rates 
-                    WHERE date <= %s AND currency = %s
-                    ORDER BY date DESC 
-                    LIMIT 1
-                    """, (rate_date, currency))
-                    result = cursor.fetchone()
-                    return float(result['rate']) if result else None
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT rate FROM exchange_rates 
+                WHERE date <= %s AND currency = %s
+                ORDER BY date DESC 
+                LIMIT 1
+                """, (rate_date, currency))
+                result = cursor.fetchone()
+                return float(result['rate']) if result else None
         except Exception as e:
             logger.error(f"Error getting exchange rate: {e}")
             return None
     
-    async def add_user(self, user_id: int, username: str = None, 
-                       display_name: str = None, first_name: str = None, 
-                       last_name: str = None) -> bool:
+    @run_in_pool_thread
+    def add_user(self, user_id: int, username: str = None, 
+                 display_name: str = None, first_name: str = None, 
+                 last_name: str = None) -> bool:
         """Add or update user information"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO users (user_id, username, display_name, first_name, last_name)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id) 
-                    DO UPDATE SET 
-                        username = EXCLUDED.username,
-                        display_name = EXCLUDED.display_name,
-                        first_name = EXCLUDED.first_name,
-                        last_name = EXCLUDED.last_name,
-                        updated_at = CURRENT_TIMESTAMP
-                    """, (user_id, username, display_name, first_name, last_name))
-                    conn.commit()
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                self._ensure_prepared(conn)
+                cursor = conn.cursor()
+                cursor.execute(
+                    "EXECUTE add_user_stmt (%s, %s, %s, %s, %s)",
+                    (user_id, username, display_name, first_name, last_name)
+                )
+                conn.commit()
+                self._user_name_cache.pop(user_id, None)
+                return True
         except Exception as e:
             logger.error(f"Error adding user: {e}")
             return False
     
-    async def add_transaction(self, user_id: int, group_id: int, 
-                            transaction_date: date, currency: str, 
-                            amount: float, transaction_type: str,
-                            created_by: int = None, description: str = None) -> bool:
+    @run_in_pool_thread
+    def add_users_bulk(self, rows: List[Tuple]) -> bool:
+        """Add or update many users in one transaction
+
+        Each row is (user_id, username, display_name, first_name).
+        """
+        try:
+            # ON CONFLICT cannot touch the same row twice in one statement
+            rows = list({row[0]: row for row in rows}.values())
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                psycopg2.extras.execute_values(cursor, """
+                INSERT INTO users (user_id, username, display_name, first_name)
+                VALUES %s
+                ON CONFLICT (user_id) 
+                DO UPDATE SET 
+                    username = EXCLUDED.username,
+                    display_name = EXCLUDED.display_name,
+                    first_name = EXCLUDED.first_name,
+                    updated_at = CURRENT_TIMESTAMP
+                """, rows)
+                conn.commit()
+                for row in rows:
+                    self._user_name_cache.pop(row[0], None)
+                return True
+        except Exception as e:
+            logger.error(f"Error adding users in bulk: {e}")
+            return False
+    
+    @run_in_pool_thread
+    def add_transaction(self, user_id: int, group_id: int, 
+                      transaction_date: date, currency: str, 
+                      amount: float, transaction_type: str,
+                      created_by: int = None, description: str = None) -> bool:
         """Add a financial transaction"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO transactions (user_id, group_id, date, currency, amount, transaction_type, created_by, description)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (user_id, group_id, transaction_date, currency, amount, transaction_type, created_by, description))
-                    conn.commit()
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                self._ensure_prepared(conn)
+                cursor = conn.cursor()
+                cursor.execute(
+                    "EXECUTE add_transaction_stmt (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    (user_id, group_id, transaction_date, currency, amount, transaction_type, created_by, description)
+                )
+                conn.commit()
+                return True
         except Exception as e:
             logger.error(f"Error adding transaction: {e}")
             return False
     
-    async def get_user_transactions(self, user_id: int, group_id: int = None, month: int = None, 
-                                  year: int = None) -> List[Dict]:
+    @run_in_pool_thread
+    def get_user_transactions(self, user_id: int, group_id: int = None, month: int = None, 
+                            year: int = None) -> List[Dict]:
         """Get user transactions for specified period in specific group"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    
-                    query = "SELECT * FROM transactions WHERE user_id = %s"
-                    params = [user_id]
-                    
-                    if group_id:
-                        query += " AND group_id = %s"
-                        params.append(group_id)
-                    
-                    if month and year:
-                        query += " AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s"
-                        params.extend([month, year])
-                    
-                    query += " ORDER BY date DESC"
-                    
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                    
-                    return [dict(row) for row in results] if results else []
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                
+                query = "SELECT * FROM transactions WHERE user_id = %s"
+                params = [user_id]
+                
+                if group_id:
+                    query += " AND group_id = %s"
+                    params.append(group_id)
+                
+                if month and year:
+                    query += " AND date >= %s AND date < %s"
+                    params.extend(month_range(year, month))
+                
+                query += " ORDER BY date DESC"
+                
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+                
+                return [dict(row) for row in results] if results else []
         except Exception as e:
             logger.error(f"Error getting user transactions: {e}")
             return []
     
-    async def get_group_transactions(self, group_id: int, month: int = None, 
-                                   year: int = None) -> List[Dict]:
+    @run_in_pool_thread
+    def get_group_transactions(self, group_id: int, month: int = None, 
+                             year: int = None) -> List[Dict]:
         """Get group transactions for specified period"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
 
-                    query = "SELECT * FROM transactions WHERE group_id = %s"
-                    params = [group_id]
+                query = "SELECT * FROM transactions WHERE group_id = %s"
+                params = [group_id]
 
-                    if month and year:
-                        query += " AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s"
-                        params.extend([month, year])
+                if month and year:
+                    query += " AND date >= %s AND date < %s"
+                    params.extend(month_range(year, month))
 
-                    query += " ORDER BY date DESC"
+                query += " ORDER BY date DESC"
 
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
+                cursor.execute(query, params)
+                results = cursor.fetchall()
 
-                    return [dict(row) for row in results] if results else []
-                finally:
-                    conn.close()
+                return [dict(row) for row in results] if results else []
         except Exception as e:
             logger.error(f"Error getting group transactions: {e}")
             return []
 
-    async def get_group_transactions_by_date(self, group_id: int, target_date: date) -> List[Dict]:
+    @run_in_pool_thread
+    def get_group_transactions_by_date(self, group_id: int, target_date: date) -> List[Dict]:
         """Get all transactions for a specific group on a specific date"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
 
-                    cursor.execute("""
-                    SELECT t.*, u.username, u.display_name, u.first_name 
-                    FROM transactions t
-                    LEFT JOIN users u ON t.user_id = u.user_id
-                    WHERE t.group_id = %s AND t.date = %s
-                    ORDER BY t.created_at DESC
-                    """, (group_id, target_date))
+                cursor.execute("""
+                SELECT t.*, u.username, u.display_name, u.first_name 
+                FROM transactions t
+                LEFT JOIN users u ON t.user_id = u.user_id
+                WHERE t.group_id = %s AND t.date = %s
+                ORDER BY t.created_at DESC
+                """, (group_id, target_date))
 
-                    rows = cursor.fetchall()
+                rows = cursor.fetchall()
 
-                    return [dict(row) for row in rows]
-                finally:
-                    conn.close()
+                return [dict(row) for row in rows]
 
         except Exception as e:
             logger.error(f"Error getting group transactions by date: {e}")
             return []
     
-    async def get_all_groups_transactions(self, month: int = None, year: int = None) -> List[Dict]:
+    @run_in_pool_thread
+    def get_group_daily_total(self, group_id: int, target_date: date) -> float:
+        """Get a group's net income minus expenses on a specific date"""
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) AS total
+                FROM transactions
+                WHERE group_id = %s AND date = %s
+                """, (group_id, target_date))
+                result = cursor.fetchone()
+                return (result['total'] if result else None) or 0.0
+        except Exception as e:
+            logger.error(f"Error getting daily total: {e}")
+            return 0.0
+    
+    @run_in_pool_thread
+    def get_group_monthly_total(self, group_id: int, year: int, month: int) -> float:
+        """Get a group's net income minus expenses for a month"""
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE -amount END) AS total
+                FROM transactions
+                WHERE group_id = %s AND date >= %s AND date < %s
+                """, (group_id, *month_range(year, month)))
+                result = cursor.fetchone()
+                return (result['total'] if result else None) or 0.0
+        except Exception as e:
+            logger.error(f"Error getting monthly total: {e}")
+            return 0.0
+    
+    @run_in_pool_thread
+    def get_all_groups_transactions(self, month: int = None, year: int = None) -> List[Dict]:
         """Get transactions from all groups for fleet report"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    
-                    query = "SELECT * FROM transactions"
-                    params = []
-                    
-                    if month and year:
-                        query += " WHERE EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s"
-                        params.extend([month, year])
-                    
-                    query += " ORDER BY date DESC"
-                    
-                    cursor.execute(query, params)
-                    results = cursor.fetchall()
-                    
-                    return [dict(row) for row in results] if results else []
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                
+                query = "SELECT * FROM transactions"
+                params = []
+                
+                if month and year:
+                    query += " WHERE date >= %s AND date < %s"
+                    params.extend(month_range(year, month))
+                
+                query += " ORDER BY date DESC"
+                
+                cursor.execute(query, params)
+                results = cursor.fetchall()
+                
+                return [dict(row) for row in results] if results else []
         except Exception as e:
             logger.error(f"Error getting all groups transactions: {e}")
             return []
     
-    async def delete_transaction(self, user_id: int, transaction_date: date, 
-                               currency: str, amount: float) -> bool:
+    @run_in_pool_thread
+    def get_fleet_daily_aggregates(self, year: int, month: int) -> List[Dict]:
+        """Sum each day's TW/CN income per group for the fleet report, by date and group,
+        with the group's name joined in"""
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT t.date, t.group_id, g.group_name,
+                       SUM(CASE WHEN t.currency = 'TW' THEN t.amount ELSE 0 END)::float AS tw,
+                       SUM(CASE WHEN t.currency = 'CN' THEN t.amount ELSE 0 END)::float AS cn
+                FROM transactions t
+                LEFT JOIN groups g ON g.group_id = t.group_id
+                WHERE t.transaction_type = 'income' AND t.currency IN ('TW', 'CN')
+                  AND t.date >= %s AND t.date < %s
+                GROUP BY t.date, t.group_id, g.group_name
+                ORDER BY t.date, t.group_id
+                """, month_range(year, month))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting fleet daily aggregates: {e}")
+            return []
+    
+    @run_in_pool_thread
+    def get_fleet_daily_totals(self, year: int, month: int) -> List[Dict]:
+        """Sum each day's TW/CN income across all groups, latest day first"""
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT date,
+                       SUM(CASE WHEN currency = 'TW' THEN amount ELSE 0 END)::float AS tw,
+                       SUM(CASE WHEN currency = 'CN' THEN amount ELSE 0 END)::float AS cn
+                FROM transactions
+                WHERE transaction_type = 'income' AND currency IN ('TW', 'CN')
+                  AND date >= %s AND date < %s
+                GROUP BY date
+                ORDER BY date DESC
+                """, month_range(year, month))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting fleet daily totals: {e}")
+            return []
+    
+    @run_in_pool_thread
+    def delete_transaction(self, user_id: int, transaction_date: date, 
+                         currency: str, amount: float) -> bool:
         """Delete a specific transaction"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    DELETE FROM transactions 
-                    WHERE user_id = %s AND date = %s AND currency = %s AND amount = %s
-                    """, (user_id, transaction_date, currency, amount))
-                    conn.commit()
-                    return cursor.rowcount > 0
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                DELETE FROM transactions 
+                WHERE user_id = %s AND date = %s AND currency = %s AND amount = %s
+                """, (user_id, transaction_date, currency, amount))
+                conn.commit()
+                return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting transaction: {e}")
             return False
     
-    async def delete_monthly_transactions(self, user_id: int, month: int, 
-                                        year: int, currency: str = None) -> bool:
+    @run_in_pool_thread
+    def delete_transactions_bulk(self, user_id: int, rows: List[Tuple]) -> int:
+        """Delete many specific transactions in one statement
+
+        Each row is (date, currency, amount). Returns the number of rows deleted.
+        """
+        if not rows:
+            return 0
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                # One page so rowcount covers every row
+                psycopg2.extras.execute_values(cursor, """
+                DELETE FROM transactions t
+                USING (VALUES %s) AS d(user_id, date, currency, amount)
+                WHERE t.user_id = d.user_id AND t.date = d.date
+                AND t.currency = d.currency AND t.amount = d.amount
+                """, [(user_id, *row) for row in rows],
+                    template="(%s::bigint, %s::date, %s, %s::numeric)", page_size=len(rows))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Error deleting transactions in bulk: {e}")
+            return 0
+    
+    @run_in_pool_thread
+    def delete_monthly_transactions(self, user_id: int, month: int, 
+                                  year: int, currency: str = None) -> bool:
         """Delete all transactions for a specific month"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    
-                    query = """
-                    DELETE FROM transactions 
-                    WHERE user_id = %s AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s
-                    """
-                    params = [user_id, month, year]
-                    
-                    if currency:
-                        query += " AND currency = %s"
-                        params.append(currency)
-                    
-                    cursor.execute(query, params)
-                    conn.commit()
-                    return cursor.rowcount > 0
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                
+                query = """
+                DELETE FROM transactions 
+                WHERE user_id = %s AND date >= %s AND date < %s
+                """
+                params = [user_id, *month_range(year, month)]
+                
+                if currency:
+                    query += " AND currency = %s"
+                    params.append(currency)
+                
+                cursor.execute(query, params)
+                conn.commit()
+                return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting monthly transactions: {e}")
             return False
     
-    async def update_fund(self, fund_type: str, amount: float, currency: str,
-                         group_id: int, updated_by: int) -> bool:
+    @run_in_pool_thread
+    def update_fund(self, fund_type: str, amount: float, currency: str,
+                   group_id: int, updated_by: int) -> bool:
         """Update fund amount"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO fund_balances (fund_type, currency, amount, group_id, updated_by)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT (fund_type, currency, group_id) 
-                    DO UPDATE SET 
-                        amount = EXCLUDED.amount,
-                        updated_by = EXCLUDED.updated_by,
-                        updated_at = CURRENT_TIMESTAMP
-                    """, (fund_type, currency, amount, group_id, updated_by))
-                    conn.commit()
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                INSERT INTO fund_balances (fund_type, currency, amount, group_id, updated_by)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (fund_type, currency, group_id) 
+                DO UPDATE SET 
+                    amount = EXCLUDED.amount,
+                    updated_by = EXCLUDED.updated_by,
+                    updated_at = CURRENT_TIMESTAMP
+                """, (fund_type, currency, amount, group_id, updated_by))
+                conn.commit()
+                return True
         except Exception as e:
             logger.error(f"Error updating fund: {e}")
             return False
     
-    async def get_fund_balance(self, fund_type: str, group_id: int) -> Dict[str, float]:
+    @run_in_pool_thread
+    def get_fund_balance(self, fund_type: str, group_id: int) -> Dict[str, float]:
         """Get current fund balance"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    SELECT currency, amount FROM fund_balances 
-                    WHERE fund_type = %s AND group_id = %s
-                    """, (fund_type, group_id))
-                    results = cursor.fetchall()
-                    
-                    balances = {}
-                    for row in results:
-                        balances[row['currency']] = float(row['amount'])
-                    
-                    return balances
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT currency, amount FROM fund_balances 
+                WHERE fund_type = %s AND group_id = %s
+                """, (fund_type, group_id))
+                results = cursor.fetchall()
+                
+                balances = {}
+                for row in results:
+                    balances[row['currency']] = float(row['amount'])
+                
+                return balances
         except Exception as e:
             logger.error(f"Error getting fund balance: {e}")
             return {}
     
-    async def add_or_update_group(self, group_id: int, group_name: str) -> bool:
+    @run_in_pool_thread
+    def add_or_update_group(self, group_id: int, group_name: str) -> bool:
         """Add or update group information"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO groups (group_id, group_name)
-                    VALUES (%s, %s)
-                    ON CONFLICT (group_id) 
-                    DO UPDATE SET group_name = EXCLUDED.group_name
-                    """, (group_id, group_name))
-                    conn.commit()
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                INSERT INTO groups (group_id, group_name)
+                VALUES (%s, %s)
+                ON CONFLICT (group_id) 
+                DO UPDATE SET group_name = EXCLUDED.group_name
+                """, (group_id, group_name))
+                conn.commit()
+                self._group_name_cache[group_id] = group_name
+                return True
         except Exception as e:
             logger.error(f"Error adding/updating group: {e}")
             return False
     
-    async def get_group_name(self, group_id: int) -> Optional[str]:
+    @run_in_pool_thread
+    def get_group_name(self, group_id: int) -> Optional[str]:
         """Get group name by group_id"""
+        if group_id in self._group_name_cache:
+            return self._group_name_cache[group_id]
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT group_name FROM groups WHERE group_id = %s", (group_id,))
-                    result = cursor.fetchone()
-                    return result['group_name'] if result else None
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT group_name FROM groups WHERE group_id = %s", (group_id,))
+                result = cursor.fetchone()
+                if not result:
+                    return None
+                self._group_name_cache[group_id] = result['group_name']
+                return result['group_name']
         except Exception as e:
             logger.error(f"Error getting group name: {e}")
             return None
     
-    async def set_daily_exchange_rate(self, rate_date: date, currency_pair: str, rate: float, updated_by: int) -> bool:
+    @run_in_pool_thread
+    def set_daily_exchange_rate(self, rate_date: date, currency_pair: str, rate: float, updated_by: int) -> bool:
         """Set exchange rate for a specific date and currency pair"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    INSERT INTO daily_exchange_rates (rate_date, currency_pair, rate, updated_by)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (rate_date, currency_pair) 
-                    DO UPDATE SET rate = EXCLUDED.rate, updated_by = EXCLUDED.updated_by, updated_at = CURRENT_TIMESTAMP
-                    """, (rate_date, currency_pair, rate, updated_by))
-                    conn.commit()
-                    logger.info(f"Set {currency_pair} exchange rate for {rate_date}: {rate}")
-                    return True
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                INSERT INTO daily_exchange_rates (rate_date, currency_pair, rate, updated_by)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (rate_date, currency_pair) 
+                DO UPDATE SET rate = EXCLUDED.rate, updated_by = EXCLUDED.updated_by, updated_at = CURRENT_TIMESTAMP
+                """, (rate_date, currency_pair, rate, updated_by))
+                conn.commit()
+                logger.info(f"Set {currency_pair} exchange rate for {rate_date}: {rate}")
+                return True
         except Exception as e:
             logger.error(f"Error setting daily exchange rate: {e}")
             return False
     
-    async def get_daily_exchange_rate(self, rate_date: date, currency_pair: str) -> Optional[float]:
+    @run_in_pool_thread
+    def get_daily_exchange_rate(self, rate_date: date, currency_pair: str) -> Optional[float]:
         """Get exchange rate for a specific date and currency pair"""
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                    SELECT rate FROM daily_exchange_rates 
-                    WHERE rate_date = %s AND currency_pair = %s
-                    """, (rate_date, currency_pair))
-                    result = cursor.fetchone()
-                    return float(result['rate']) if result else None
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT rate FROM daily_exchange_rates 
+                WHERE rate_date = %s AND currency_pair = %s
+                """, (rate_date, currency_pair))
+                result = cursor.fetchone()
+                return float(result['rate']) if result else None
         except Exception as e:
             logger.error(f"Error getting daily exchange rate: {e}")
             return None
     
-    async def get_latest_exchange_rates(self, rate_date: date = None) -> Dict[str, float]:
+    @run_in_pool_thread
+    def get_latest_exchange_rates(self, rate_date: date = None) -> Dict[str, float]:
         """Get latest exchange rates for all currency pairs on a given date"""
         try:
             if not rate_date:
-                from datetime import date as date_type
-                rate_date = date_type.today()
+                rate_date = date.today()
             
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    # First try to get rates for the specific date
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                # First try to get rates for the specific date
+                cursor.execute("""
+                SELECT currency, rate FROM exchange_rates 
+                WHERE date = %s
+                ORDER BY created_at DESC
+                """, (rate_date,))
+                results = cursor.fetchall()
+                
+                rates = {}
+                for row in results:
+                    currency = row[0] if isinstance(row, (list, tuple)) else row['currency']
+                    rate = float(row[1] if isinstance(row, (list, tuple)) else row['rate'])
+                    # Map TW/CN to TWD/CNY for compatibility
+                    if currency == 'TW':
+                        rates['TWD'] = rate
+                    elif currency == 'CN':
+                        rates['CNY'] = rate
+                    else:
+                        rates[currency] = rate
+                
+                # If no rates found for specific date, get the most recent rates
+                if not rates:
                     cursor.execute("""
                     SELECT currency, rate FROM exchange_rates 
-                    WHERE date = %s
-                    ORDER BY created_at DESC
+                    WHERE date <= %s
+                    ORDER BY date DESC, created_at DESC
+                    LIMIT 10
                     """, (rate_date,))
                     results = cursor.fetchall()
                     
-                    rates = {}
                     for row in results:
                         currency = row[0] if isinstance(row, (list, tuple)) else row['currency']
                         rate = float(row[1] if isinstance(row, (list, tuple)) else row['rate'])
                         # Map TW/CN to TWD/CNY for compatibility
-                        if currency == 'TW':
+                        if currency == 'TW' and 'TWD' not in rates:
                             rates['TWD'] = rate
-                        elif currency == 'CN':
+                        elif currency == 'CN' and 'CNY' not in rates:
                             rates['CNY'] = rate
-                        else:
-                            rates[currency] = rate
-                    
-                    # If no rates found for specific date, get the most recent rates
-                    if not rates:
-                        cursor.execute("""
-                        SELECT currency, rate FROM exchange_rates 
-                        WHERE date <= %s
-                        ORDER BY date DESC, created_at DESC
-                        LIMIT 10
-                        """, (rate_date,))
-                        results = cursor.fetchall()
                         
-                        for row in results:
-                            currency = row[0] if isinstance(row, (list, tuple)) else row['currency']
-                            rate = float(row[1] if isinstance(row, (list, tuple)) else row['rate'])
-                            # Map TW/CN to TWD/CNY for compatibility
-                            if currency == 'TW' and 'TWD' not in rates:
-                                rates['TWD'] = rate
-                            elif currency == 'CN' and 'CNY' not in rates:
-                                rates['CNY'] = rate
-                            
-                    # Ensure we have both currencies with fallback to defaults
-                    if 'TWD' not in rates:
-                        rates['TWD'] = 30.0
-                    if 'CNY' not in rates:
-                        rates['CNY'] = 7.0
-                    
-                    return rates
-                finally:
-                    conn.close()
+                # Ensure we have both currencies with fallback to defaults
+                if 'TWD' not in rates:
+                    rates['TWD'] = 30.0
+                if 'CNY' not in rates:
+                    rates['CNY'] = 7.0
+                
+                return rates
         except Exception as e:
             logger.error(f"Error getting latest exchange rates: {e}")
             return {'TWD': 30.0, 'CNY': 7.0}
     
-    async def get_user_display_name(self, user_id: int) -> Optional[str]:
+    @run_in_pool_thread
+    def get_exchange_rates_for_dates(self, dates) -> Dict[date, Dict[str, float]]:
+        """Get the TWD/CNY rates in effect on each of the given dates in one query"""
+        if not dates:
+            return {}
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                SELECT date, currency, rate FROM exchange_rates
+                WHERE date <= %s AND currency IN ('TW', 'CN')
+                ORDER BY date
+                """, (max(dates),))
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting exchange rates: {e}")
+            rows = []
+        return rates_by_date(rows, dates)
+    
+    @run_in_pool_thread
+    def get_user_display_name(self, user_id: int) -> Optional[str]:
         """Get user display name by user_id"""
+        if user_id in self._user_name_cache:
+            return self._user_name_cache[user_id]
         try:
-            async with self._lock:
-                conn = self.get_connection()
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT display_name, first_name, username FROM users WHERE user_id = %s", (user_id,))
-                    result = cursor.fetchone()
-                    if result:
-                        # Prefer display_name, fallback to first_name, then username
-                        return result['display_name'] or result['first_name'] or result['username'] or f"User{user_id}"
-                    return f"User{user_id}"
-                finally:
-                    conn.close()
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT display_name, first_name, username FROM users WHERE user_id = %s", (user_id,))
+                result = cursor.fetchone()
+                if result:
+                    # Prefer display_name, fallback to first_name, then username
+                    name = result['display_name'] or result['first_name'] or result['username'] or f"User{user_id}"
+                    self._user_name_cache[user_id] = name
+                    return name
+                return f"User{user_id}"
         except Exception as e:
             logger.error(f"Error getting user display name: {e}")
-            return f"User{user_id}"
\ No newline at end of file
+            return f"User{user_id}"
+    
+    @run_in_pool_thread
+    def get_user_display_names(self, user_ids) -> Dict[int, str]:
+        """Get display names for several users at once, keyed by user_id"""
+        names = {uid: self._user_name_cache[uid] for uid in user_ids if uid in self._user_name_cache}
+        missing = [uid for uid in set(user_ids) if uid not in names]
+        if not missing:
+            return names
+        try:
+            with self.acquire() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT user_id, display_name, first_name, username FROM users WHERE user_id = ANY(%s)",
+                    (missing,)
+                )
+                # Prefer display_name, fallback to first_name, then username
+                for row in cursor.fetchall():
+                    name = row['display_name'] or row['first_name'] or row['username'] or f"User{row['user_id']}"
+                    self._user_name_cache[row['user_id']] = name
+                    names[row['user_id']] = name
+        except Exception as e:
+            logger.error(f"Error getting user display names: {e}")
+        return names
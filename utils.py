@@ -4,11 +4,18 @@ Handles formatting, validation, and common operations
 """
 
 import re
+import time
+import calendar
 import logging
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from itertools import product
 from datetime import datetime, date
 from typing import Optional, Tuple, Dict, List
 from decimal import Decimal, InvalidOperation
 
+import timezone_utils
+
 logger = logging.getLogger(__name__)
 
 def fix_html_tags(text: str) -> str:
@@ -46,7 +53,7 @@ def fix_html_tags(text: str) -> str:
         # Fix <strong>text<strong> -> <strong>text</strong>
         (r'<strong>([^<]*)<strong>', r'<strong>\1</strong>'),
         # Fix <i>text<i> -> <i>text</i>
-        (r'<i>text<i>', r'<i>\1</i>'),
+        (r'<i>([^<]*)<i>', r'<i>\1</i>'),
     ]
     
     for pattern, replacement in missing_closing_fixes:
@@ -54,6 +61,26 @@ def fix_html_tags(text: str) -> str:
     
     return text
 
+@dataclass(slots=True)
+class TransactionData:
+    """A parsed transaction command"""
+    user_id: Optional[int]
+    mentioned_user: Optional[str]
+    date: date
+    currency: str
+    amount: float
+    transaction_type: str
+    original_text: str
+
+
+@dataclass(slots=True)
+class FundCommand:
+    """A parsed fund management command"""
+    fund_type: str
+    operation: str
+    amount: float
+
+
 class TransactionParser:
     """Parse transaction commands and extract relevant information"""
     
@@ -77,8 +104,40 @@ class TransactionParser:
         r'(\d{1,2})月(\d{1,2})日',  # MM月DD日
     ]
     
+    # Fund type patterns
+    FUND_PATTERNS = {
+        'public': r'(?:公桶|公共)',
+        'private': r'(?:私人|個人)'
+    }
+    
+    # Compiled once at import; parse_transaction runs on every group message
+    DATE_REGEXES = [re.compile(pattern) for pattern in DATE_PATTERNS]
+    
+    # Currency + optional sign + amount, tried in currency-then-type order
+    SIGNED_AMOUNT_REGEXES = [
+        (curr_key, trans_key, re.compile(rf'{curr_pattern}\s*(?:{trans_pattern}\s*)?(-?\d+(?:\.\d+)?)', re.IGNORECASE))
+        for (curr_key, curr_pattern), (trans_key, trans_pattern)
+        in product(CURRENCY_PATTERNS.items(), TRANSACTION_PATTERNS.items())
+    ]
+    
+    # Currency + amount without a sign
+    UNSIGNED_AMOUNT_REGEXES = [
+        (curr_key, re.compile(rf'{curr_pattern}\s*([\d]+(?:\.\d+)?)', re.IGNORECASE))
+        for curr_key, curr_pattern in CURRENCY_PATTERNS.items()
+    ]
+    
+    # Leading minus with optional currency, e.g. -500 or -CN500
+    NEGATIVE_AMOUNT_REGEX = re.compile(r'(-)(?:(TW|台幣|臺幣|CN|人民幣|RMB)\s*)?(\d+(?:\.\d+)?)', re.IGNORECASE)
+    
+    FUND_AMOUNT_REGEXES = [
+        (fund_key, op_key, op_pattern,
+         re.compile(rf'{fund_pattern}\s*(?:{op_pattern}\s*)?(-?\d+(?:\.\d+)?)', re.IGNORECASE))
+        for (fund_key, fund_pattern), (op_key, op_pattern)
+        in product(FUND_PATTERNS.items(), TRANSACTION_PATTERNS.items())
+    ]
+    
     @classmethod
-    def parse_transaction(cls, text: str, user_id: int = None) -> Optional[Dict]:
+    def parse_transaction(cls, text: str, user_id: int = None) -> Optional[TransactionData]:
         """Parse transaction command and return transaction details"""
         try:
             text = text.strip()
@@ -94,8 +153,8 @@ class TransactionParser:
             
             # Parse date
             transaction_date = None
-            for pattern in cls.DATE_PATTERNS:
-                match = re.search(pattern, text)
+            for regex in cls.DATE_REGEXES:
+                match = regex.search(text)
                 if match:
                     try:
                         if len(match.groups()) == 2:  # MM/DD or MM-DD
@@ -106,7 +165,7 @@ class TransactionParser:
                             year, month, day = match.groups()
                             transaction_date = date(int(year), int(month), int(day))
                         # Remove date from text
-                        text = re.sub(pattern, '', text).strip()
+                        text = regex.sub('', text).strip()
                         break
                     except ValueError:
                         continue
@@ -121,52 +180,46 @@ class TransactionParser:
             transaction_type = None
             
             # First try with explicit + or - signs
-            for curr_key, curr_pattern in cls.CURRENCY_PATTERNS.items():
-                for trans_key, trans_pattern in cls.TRANSACTION_PATTERNS.items():
-                    # Pattern: Currency + TransactionType + Amount
-                    # Allow negative sign directly before amount for expense
-                    pattern = f'{curr_pattern}\s*(?:{trans_pattern}\s*)?(-?\d+(?:\.\d+)?)'
-                    match = re.search(pattern, text, re.IGNORECASE)
-                    
-                    if match:
-                        amount_str = match.group(1)
-                        try:
-                            amount_val = float(amount_str)
-                        except ValueError:
-                            continue # Invalid amount
+            # Pattern: Currency + TransactionType + Amount
+            # Allow negative sign directly before amount for expense
+            for curr_key, trans_key, regex in cls.SIGNED_AMOUNT_REGEXES:
+                match = regex.search(text)
+                
+                if match:
+                    amount_str = match.group(1)
+                    try:
+                        amount_val = float(amount_str)
+                    except ValueError:
+                        continue # Invalid amount
 
-                        currency = curr_key
-                        # Determine transaction type based on explicit sign or inferred from amount
-                        if trans_key == 'expense' or amount_val < 0:
-                            transaction_type = 'expense'
-                            amount = abs(amount_val) # Store absolute amount
-                        elif trans_key == 'income' or amount_val >= 0:
-                            transaction_type = 'income'
-                            amount = abs(amount_val) # Store absolute amount
-                        else:
-                            # Fallback for ambiguous cases, assume income if no explicit sign
-                            transaction_type = 'income'
-                            amount = abs(amount_val)
+                    currency = curr_key
+                    # Determine transaction type based on explicit sign or inferred from amount
+                    if trans_key == 'expense' or amount_val < 0:
+                        transaction_type = 'expense'
+                        amount = abs(amount_val) # Store absolute amount
+                    elif trans_key == 'income' or amount_val >= 0:
+                        transaction_type = 'income'
+                        amount = abs(amount_val) # Store absolute amount
+                    else:
+                        # Fallback for ambiguous cases, assume income if no explicit sign
+                        transaction_type = 'income'
+                        amount = abs(amount_val)
 
-                        # If a transaction type was explicitly matched by pattern, use it
-                        if match.group(0).count('+') + match.group(0).count('＋') > 0:
-                            transaction_type = 'income'
-                        elif match.group(0).count('-') + match.group(0).count('－') > 0:
-                            transaction_type = 'expense'
-                            # This part might need more sophisticated logic if "CN500" can mean expense in some contexts.
-                            pass # Keep as is, or add specific logic if needed
+                    # If a transaction type was explicitly matched by pattern, use it
+                    if match.group(0).count('+') + match.group(0).count('＋') > 0:
+                        transaction_type = 'income'
+                    elif match.group(0).count('-') + match.group(0).count('－') > 0:
+                        transaction_type = 'expense'
+                        # This part might need more sophisticated logic if "CN500" can mean expense in some contexts.
+                        pass # Keep as is, or add specific logic if needed
 
-                        break
-                
-                if currency:
                     break
             
             # If no explicit sign found, try default format: Currency + Amount (assume expense for CN, income for TW)
             if not currency:
-                for curr_key, curr_pattern in cls.CURRENCY_PATTERNS.items():
+                for curr_key, regex in cls.UNSIGNED_AMOUNT_REGEXES:
                     # Pattern: Currency + Amount (without explicit + or -)
-                    pattern = f'{curr_pattern}\s*([\d]+(?:\.\d+)?)'
-                    match = re.search(pattern, text, re.IGNORECASE)
+                    match = regex.search(text)
                     
                     if match:
                         amount_str = match.group(1)
@@ -188,8 +241,7 @@ class TransactionParser:
                  # Try parsing format like -500 or -CN500
                 # Regex for optional currency, mandatory minus, then amount
                 # Adjusted to be more specific for negative amounts without explicit currency type before them
-                pattern_neg_amount = r'(-)(?:(TW|台幣|臺幣|CN|人民幣|RMB)\s*)?(\d+(?:\.\d+)?)'
-                match_neg_amount = re.search(pattern_neg_amount, text, re.IGNORECASE)
+                match_neg_amount = cls.NEGATIVE_AMOUNT_REGEX.search(text)
                 if match_neg_amount:
                     sign = match_neg_amount.group(1)
                     curr_text = match_neg_amount.group(2)
@@ -218,71 +270,60 @@ class TransactionParser:
             if not currency or amount is None:
                 return None
             
-            return {
-                'user_id': user_id,
-                'mentioned_user': mentioned_user,
-                'date': transaction_date,
-                'currency': currency,
-                'amount': amount,
-                'transaction_type': transaction_type,
-                'original_text': text
-            }
+            return TransactionData(
+                user_id=user_id,
+                mentioned_user=mentioned_user,
+                date=transaction_date,
+                currency=currency,
+                amount=amount,
+                transaction_type=transaction_type,
+                original_text=text
+            )
             
         except Exception as e:
             logger.error(f"Error parsing transaction: {e}")
             return None
     
     @classmethod
-    def parse_fund_command(cls, text: str) -> Optional[Dict]:
+    def parse_fund_command(cls, text: str) -> Optional[FundCommand]:
         """Parse fund management command"""
         try:
             text = text.strip()
             
-            # Fund type patterns
-            fund_patterns = {
-                'public': r'(?:公桶|公共)',
-                'private': r'(?:私人|個人)'
-            }
-            
             fund_type = None
             amount = None
             operation = None
             
-            for fund_key, fund_pattern in fund_patterns.items():
-                for op_key, op_pattern in cls.TRANSACTION_PATTERNS.items():
-                    # Allow negative sign directly before amount for expense
-                    pattern = f'{fund_pattern}\s*(?:{op_pattern}\s*)?(-?\d+(?:\.\d+)?)'
-                    match = re.search(pattern, text, re.IGNORECASE)
-                    
-                    if match:
-                        amount_str = match.group(1)
-                        try:
-                            amount_val = float(amount_str)
-                        except ValueError:
-                            continue
-
-                        fund_type = fund_key
-                        if op_pattern in text or amount_val < 0:
-                            operation = 'expense' if amount_val < 0 else op_key
-                            if operation == 'expense' and amount_val > 0:
-                                amount_val = -amount_val
-                        else:
-                            operation = 'income'
-                        
-                        amount = abs(amount_val)
-                        break
+            # Allow negative sign directly before amount for expense
+            for fund_key, op_key, op_pattern, regex in cls.FUND_AMOUNT_REGEXES:
+                match = regex.search(text)
                 
-                if fund_type:
+                if match:
+                    amount_str = match.group(1)
+                    try:
+                        amount_val = float(amount_str)
+                    except ValueError:
+                        continue
+
+                    fund_type = fund_key
+                    if op_pattern in text or amount_val < 0:
+                        operation = 'expense' if amount_val < 0 else op_key
+                        if operation == 'expense' and amount_val > 0:
+                            amount_val = -amount_val
+                    else:
+                        operation = 'income'
+                    
+                    amount = abs(amount_val)
                     break
             
             if not fund_type or amount is None:
                 return None
             
-            return {
-                'fund_type': fund_type,
-                'operation': operation,
-                'amount': amount
-            }
+            return FundCommand(
+                fund_type=fund_type,
+                operation=operation,
+                amount=amount
+            )
             
         except Exception as e:
             logger.error(f"Error parsing fund command: {e}")
@@ -352,9 +393,6 @@ class ReportFormatter:
             ]
             
             # Group transactions by date and add daily breakdown
-            from collections import defaultdict
-            import calendar
-            
             # Group transactions by date
             daily_transactions = defaultdict(lambda: {'TW': 0, 'CN': 0})
             
@@ -426,7 +464,6 @@ class ReportFormatter:
             
             # Get exchange rates from database or use defaults
             if db_manager:
-                import timezone_utils
                 today = timezone_utils.get_taiwan_today()
                 tw_rate = await db_manager.get_exchange_rate(today)
                 tw_rate = tw_rate if tw_rate else 30.2  # Fallback to default
@@ -604,6 +641,79 @@ class ValidationUtils:
             return None
 
 
+@dataclass(slots=True)
+class UserState:
+    """Where a user is in a multi-step operation such as clearing a report"""
+    action: str
+    step: str
+    date: Optional[str] = None
+
+
+class UserStateStore:
+    """Per-user conversation state that expires after ``ttl`` seconds
+
+    Entries are kept in insertion order, which with a fixed ``ttl`` is also
+    expiry order, so expired entries are pruned from the front on every write
+    and the oldest are evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 10_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def __setitem__(self, key, value):
+        now = time.monotonic()
+        self._data.pop(key, None)
+        self._data[key] = (now + self.ttl, value)
+        self.prune(now)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def prune(self, now: float = None):
+        """Drop expired entries from the front of the store"""
+        if now is None:
+            now = time.monotonic()
+        data = self._data
+        while data:
+            key, (expires_at, _) = next(iter(data.items()))
+            if expires_at > now:
+                break
+            del data[key]
+
+    def __getitem__(self, key):
+        expires_at, value = self._data[key]
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+
 class PersonalReportFormatter:
     """Personal report formatting functions"""
     
@@ -623,8 +733,9 @@ class PersonalReportFormatter:
         except (ValueError, TypeError):
             return 0.0
     
-    def format_personal_report(self, transactions: List[Dict], user_name: str, group_name: str = "個人") -> str:
-        """Format personal financial report"""
+    def format_personal_report(self, transactions: List[Dict], user_name: str, group_name: str = "個人",
+                               tw_rate: float = 30.0, cn_rate: float = 7.0) -> str:
+        """Format personal financial report, converting to USDT at the given rates"""
         try:
             if not transactions:
                 return f"📊 <b>{user_name}個人報表</b>\n\n❌ 本月暫無交易記錄"
@@ -643,8 +754,6 @@ class PersonalReportFormatter:
                     continue
             
             # Calculate USDT equivalents
-            tw_rate = 30.0
-            cn_rate = 7.0
             tw_usdt = totals['TW'] / tw_rate if totals['TW'] > 0 else 0
             cn_usdt = totals['CN'] / cn_rate if totals['CN'] > 0 else 0
             
@@ -714,65 +823,3 @@ class PersonalReportFormatter:
         except Exception as e:
             logger.error(f"Error formatting personal report: {e}")
             return f"❌ 個人報表格式化失敗: {str(e)}"
-
-
-class FleetReportFormatter:
-    """Fleet report formatting functions"""
-    
-    def safe_decimal_to_float(self, value):
-        """Safely convert Decimal or any numeric value to float"""
-        try:
-            if isinstance(value, Decimal):
-                return float(value)
-            elif isinstance(value, (int, float)):
-                return float(value)
-            elif hasattr(value, '__float__'):
-                return float(value)
-            return 0.0
-        except (ValueError, TypeError):
-            return 0.0
-    
-    def format_fleet_report(self, all_groups_data: List[Dict]) -> str:
-        """Format fleet report aggregating all groups"""
-        try:
-            if not all_groups_data:
-                return "📊 <b>車隊報表</b>\n\n❌ 暫無數據"
-            
-            # Calculate total across all groups
-            fleet_totals = {'TW': 0.0, 'CN': 0.0}
-            group_summaries = {}
-            
-            for group_data in all_groups_data:
-                try:
-                    group_name = group_data.get('group_name', '未知群組')
-                    transactions = group_data.get('transactions', [])
-                    
-                    group_totals = {'TW': 0.0, 'CN': 0.0}
-                    
-                    for t in transactions:
-                        if t.get('transaction_type') == 'income':
-                            currency = str(t.get('currency', ''))
-                            amount = self.safe_decimal_to_float(t.get('amount', 0))
-                            if currency in group_totals:
-                                group_totals[currency] += amount
-                                fleet_totals[currency] += amount
-                    
-                    if group_totals['TW'] > 0 or group_totals['CN'] > 0:
-                        group_summaries[group_name] = group_totals
-                        
-                except Exception as e:
-                    logger.warning(f"Error processing group data for fleet report: {e}")
-                    continue
-            
-            # Calculate USDT equivalents
-            tw_rate = 30.0
-            cn_rate = 7.0
-            fleet_tw_usdt = fleet_totals['TW'] / tw_rate if fleet_totals['TW'] > 0 else 0
-            fleet_cn_usdt = fleet_totals['CN'] / cn_rate if fleet_totals['CN'] > 0 else 0
-            
-            # Build fleet report
-            report_lines = [
-                "📊 <b>車隊總報表</b>",
-                "－－－－－－－－－－",
-                "◉ 車隊台幣總業績",
-                f"<code>NT${fleet_totals['TW']:,.0f}</code> → <code>USDT${fleet_tw_usdt:,.2f}</code>
\ No newline at end of file